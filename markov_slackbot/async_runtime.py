@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+
+class AsyncRuntime(object):
+    """Runs a MarkovSlackbot on an asyncio event loop instead of polling.
+
+    The loop wakes up as soon as the RTM websocket is readable, and pings
+    Slack whenever it has been idle for ``ping_interval`` seconds. Replies
+    are generated on a pool of ``workers`` threads, and messages are handed
+    to the training worker from a single thread so they keep their order.
+    Replies are queued with the bot's MessageSender, so sending never blocks.
+    """
+
+    def __init__(self, bot, workers=4, ping_interval=3):
+        """
+        :param bot: the MarkovSlackbot to run.
+        :param workers: the number of threads replies are generated on.
+        :param ping_interval: the seconds to wait for events before pinging.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        self.workers = workers
+        self.ping_interval = ping_interval
+
+        self.loop = None
+        self.executor = None
+        self.training_executor = None
+        self.readable = None
+        self.stopping = False
+
+    def run(self):
+        """Connects and runs the bot until the connection fails or stop is
+        called.
+        """
+
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(self.workers)
+        self.training_executor = ThreadPoolExecutor(1)
+        self.stopping = False
+
+        try:
+            self.loop.run_until_complete(self.main())
+        finally:
+            self.executor.shutdown()
+            self.training_executor.shutdown()
+            self.loop.close()
+
+    def stop(self):
+        """Stops the runtime from any thread.
+        """
+
+        self.loop.call_soon_threadsafe(self.stop_now)
+
+    def stop_now(self):
+        self.stopping = True
+        self.readable.set()
+
+    async def main(self):
+        self.readable = asyncio.Event()
+
+        await self.loop.run_in_executor(self.executor, self.bot.connect)
+        await self.loop.run_in_executor(
+            self.executor, self.bot.start_services)
+
+        websocket = self.bot.slack_client.server.websocket
+        websocket_fd = websocket.sock.fileno()
+        self.loop.add_reader(websocket_fd, self.readable.set)
+
+        self.logger.info('Bot running.')
+
+        try:
+            while not self.stopping:
+                try:
+                    await asyncio.wait_for(
+                        self.readable.wait(), self.ping_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                self.readable.clear()
+                self.read_events()
+                self.bot.autoping()
+                self.bot.report_metrics()
+        finally:
+            self.loop.remove_reader(websocket_fd)
+
+    def read_events(self):
+        """Dispatches every event that has arrived.
+
+        rtm_read returns one websocket frame at a time, and frames already
+        decrypted by SSL don't make the socket readable again, so it is read
+        until there is nothing left.
+        """
+
+        while not self.stopping:
+            messages = self.bot.slack_client.rtm_read()
+
+            if not messages:
+                return
+
+            for message in messages:
+                self.dispatch(message)
+
+    def dispatch(self, message):
+        """Hands a message off to be responded to or learned.
+
+        :param message: the message.
+        """
+
+        self.logger.debug('Retrieved message: {0}'.format(message))
+
+        self.bot.name_index.update(message)
+
+        if self.bot.message_interpreter.is_respondable(message):
+            self.logger.debug('Message was respondable, responding.')
+            self.loop.run_in_executor(
+                self.executor, self.bot.respond, message)
+
+        elif self.bot.model_controller.is_learnable(message):
+            self.logger.debug('Message was learnable.')
+            self.loop.run_in_executor(
+                self.training_executor, self.bot.learn_message, message)
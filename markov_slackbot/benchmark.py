@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.slack_logs import SlackLogs
+
+
+RESULTS_FORMAT = 1
+
+# 2016-07-16, where synthetic exports start.
+EXPORT_START = 1468627200
+
+SYLLABLES = ('ba', 'ko', 'ri', 'tu', 'me', 'sha', 'lo', 'ne', 'vi', 'da',
+             'pe', 'gro', 'ul', 'an', 'zi', 'mo', 'ter', 'ka', 'fi', 'no')
+
+BOT_USER_ID = 'U0000000B'
+
+
+def generate_export(export_dir, channels=8, users=40, messages=20000,
+                    mean_words=10, words_sigma=0.8, vocabulary=5000, days=30,
+                    seed=0):
+    """Writes a synthetic slack export of line-delimited daily log files.
+
+    Words, channels and users are drawn from Zipf distributions, and the
+    number of words in a message from a lognormal distribution, all from a
+    seeded generator, so the same arguments always write the same export.
+
+    :param export_dir: the directory to write channel folders to.
+    :param channels: the number of channels.
+    :param users: the number of users.
+    :param messages: the number of messages.
+    :param mean_words: the mean number of words in a message.
+    :param words_sigma: the spread of the number of words in a message.
+    :param vocabulary: the number of distinct words.
+    :param days: the number of days the messages are spread over.
+    :param seed: the seed of the generator.
+    :returns size: the number of bytes written.
+    """
+
+    rng = random.Random(seed)
+
+    words = []
+    seen = set()
+
+    while len(words) < vocabulary:
+        word = ''.join(rng.choice(SYLLABLES)
+                       for i in range(rng.randint(1, 4)))
+
+        if word in seen:
+            word += str(len(words))
+
+        seen.add(word)
+        words.append(word)
+
+    word_weights = zipf_cumulative_weights(vocabulary)
+    channel_names = ['channel-{0}'.format(i) for i in range(channels)]
+    channel_weights = zipf_cumulative_weights(channels)
+    user_ids = ['U{0:08d}'.format(i) for i in range(users)]
+    user_weights = zipf_cumulative_weights(users)
+    words_mu = math.log(mean_words) - words_sigma ** 2 / 2
+
+    log_files = {}
+    size = 0
+
+    try:
+        for i in range(messages):
+            ts = EXPORT_START + i * days * 86400.0 / messages
+            channel_name = pick(rng, channel_names, channel_weights)
+            user = pick(rng, user_ids, user_weights)
+            word_count = max(1, int(round(
+                rng.lognormvariate(words_mu, words_sigma))))
+            text = ' '.join(pick(rng, words, word_weights)
+                            for j in range(word_count))
+            text = text.capitalize() + rng.choice('...?!')
+
+            if rng.random() < 0.05:
+                text = '<@{0}> {1}'.format(
+                    pick(rng, user_ids, user_weights), text)
+
+            message = {'type': 'message', 'user': user, 'text': text,
+                       'ts': '{0:.6f}'.format(ts)}
+
+            if rng.random() < 0.02:
+                message['subtype'] = 'channel_join'
+
+            date = datetime.datetime.utcfromtimestamp(ts).date()
+            log_file = log_files.get((channel_name, date))
+
+            if log_file is None:
+                channel_dir = os.path.join(export_dir, channel_name)
+
+                if not os.path.exists(channel_dir):
+                    os.makedirs(channel_dir)
+
+                log_file = open(os.path.join(
+                    channel_dir, date.isoformat() + '.jsonl'), 'w')
+                log_files[(channel_name, date)] = log_file
+
+            line = json.dumps(message, sort_keys=True) + '\n'
+            log_file.write(line)
+            size += len(line)
+    finally:
+        for log_file in log_files.values():
+            log_file.close()
+
+    return size
+
+
+def export_parameters_path(export_dir):
+    # Next to the export rather than in it, where it would read as a channel.
+    return os.path.normpath(export_dir) + '.parameters.json'
+
+
+def prepare_export(export_dir, **parameters):
+    """Generates a synthetic export, unless export_dir already holds one
+    generated with the same parameters.
+
+    The parameters of a generated export are saved next to it, and an export
+    generated with other parameters is replaced. A directory that holds
+    something else is never touched.
+
+    :param export_dir: the directory to write the export to.
+    :param parameters: the parameters of generate_export.
+    :returns generated: whether the export was generated.
+    """
+
+    parameters_path = export_parameters_path(export_dir)
+
+    if os.path.exists(export_dir) and os.listdir(export_dir):
+        if not os.path.exists(parameters_path):
+            raise ValueError(
+                '{0} is not a synthetic export, remove it or pick another '
+                'export directory.'.format(export_dir))
+
+        with open(parameters_path) as parameters_file:
+            if json.load(parameters_file) == parameters:
+                return False
+
+        shutil.rmtree(export_dir)
+
+    if os.path.exists(parameters_path):
+        os.remove(parameters_path)
+
+    generate_export(export_dir, **parameters)
+
+    with open(parameters_path, 'w') as parameters_file:
+        json.dump(parameters, parameters_file, sort_keys=True)
+
+    return True
+
+
+def zipf_cumulative_weights(count):
+    total = 0
+    weights = []
+
+    for rank in range(count):
+        total += 1.0 / (rank + 1)
+        weights.append(total)
+
+    return weights
+
+
+def pick(rng, items, cumulative_weights):
+    index = bisect.bisect(cumulative_weights,
+                          rng.random() * cumulative_weights[-1])
+
+    return items[min(index, len(items) - 1)]
+
+
+def latency_percentiles(latencies):
+    """Summarizes latencies in milliseconds.
+
+    :param latencies: a list of latencies in seconds.
+    :returns percentiles: a dict of p50, p90, p99 and max latencies.
+    """
+
+    if not latencies:
+        return None
+
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction),
+                             len(latencies) - 1)] * 1000
+
+    return {
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': latencies[-1] * 1000,
+    }
+
+
+def run_stage(stage, measure_memory):
+    """Runs a stage and measures it, once for time and, as tracing slows it
+    down, once more for peak memory.
+
+    :param stage: returns a function that runs the stage once it is set up.
+        That function returns the number of items processed and a list of
+        latencies, or None.
+    :param measure_memory: whether to measure peak memory.
+    :returns result: a dict of the measurements.
+    """
+
+    run = stage()
+    started = time.perf_counter()
+    count, latencies = run()
+    seconds = time.perf_counter() - started
+
+    result = {
+        'count': count,
+        'seconds': seconds,
+        'throughput': count / seconds if seconds else None,
+        'latency_ms': latency_percentiles(latencies),
+        'peak_memory_bytes': None,
+    }
+
+    if measure_memory:
+        run = stage()
+        tracemalloc.start()
+
+        try:
+            run()
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def timed(function, items):
+    """Calls function on every item, timing each call.
+
+    :returns count, latencies: the number of items and the call latencies.
+    """
+
+    latencies = []
+
+    for item in items:
+        started = time.perf_counter()
+        function(*item)
+        latencies.append(time.perf_counter() - started)
+
+    return len(latencies), latencies
+
+
+def run_benchmark(export_dir=None, channels=8, users=40, messages=20000,
+                  mean_words=10, words_sigma=0.8, vocabulary=5000, seed=0,
+                  chain_backend='dict', requests=200, writes=2000,
+                  measure_memory=True):
+    """Benchmarks reading logs, writing logs, training, learning and
+    generating on a synthetic export.
+
+    :param export_dir: a directory to write the export to and keep, a
+        temporary directory by default. It is reused by runs with the same
+        export parameters.
+    :param requests: the number of messages to generate.
+    :param writes: the number of messages to write to logs and learn.
+    :param measure_memory: whether to measure the peak memory of each stage.
+    :returns results: a JSON serializable dict of results.
+
+    The other parameters are those of generate_export and ModelController.
+    """
+
+    parameters = {
+        'channels': channels,
+        'users': users,
+        'messages': messages,
+        'mean_words': mean_words,
+        'words_sigma': words_sigma,
+        'vocabulary': vocabulary,
+        'seed': seed,
+        'chain_backend': chain_backend,
+        'requests': requests,
+        'writes': writes,
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if export_dir is None:
+            export_dir = os.path.join(work_dir, 'export')
+
+        prepare_export(export_dir, channels=channels, users=users,
+                       messages=messages, mean_words=mean_words,
+                       words_sigma=words_sigma, vocabulary=vocabulary,
+                       seed=seed)
+
+        stages = run_stages(export_dir, work_dir, parameters, measure_memory)
+
+    return {
+        'format': RESULTS_FORMAT,
+        'created': time.time(),
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+        },
+        'parameters': parameters,
+        'stages': stages,
+    }
+
+
+def run_stages(export_dir, work_dir, parameters, measure_memory):
+    rng = random.Random(parameters['seed'])
+    slack_logs = SlackLogs(export_dir)
+    controller = ModelController(BOT_USER_ID, 'bot', slack_logs, {},
+                                 chain_backend=parameters['chain_backend'])
+    channel_names = sorted(slack_logs.channel_logs)
+    users = sorted(slack_logs.user_logs)
+    write_count = [0]
+
+    new_messages = [
+        (message, rng.choice(channel_names))
+        for message in rng.sample(slack_logs.master_log,
+                                  min(parameters['writes'],
+                                      len(slack_logs.master_log)))]
+
+    requests = []
+
+    for i in range(parameters['requests']):
+        masters = [True] if i % 4 == 0 else []
+        request_channels = [rng.choice(channel_names)] if i % 4 == 1 else []
+        request_users = [rng.choice(users)] if i % 4 >= 2 else []
+
+        if i % 4 == 3:
+            request_channels = [rng.choice(channel_names)]
+
+        requests.append((masters, request_channels, request_users, []))
+
+    def ingest():
+        return lambda: (len(SlackLogs(export_dir).master_log), None)
+
+    def write_logs():
+        write_count[0] += 1
+        logs = SlackLogs(os.path.join(work_dir, 'writes{0}'.format(
+            write_count[0])))
+
+        def run():
+            try:
+                return timed(logs.write_to_logfile, new_messages)
+            finally:
+                logs.close()
+
+        return run
+
+    def startup():
+        return lambda: (
+            len(ModelController(
+                BOT_USER_ID, 'bot', slack_logs, {},
+                chain_backend=parameters['chain_backend']).channel_models),
+            None)
+
+    def train_channel():
+        return lambda: timed(
+            controller.generate_slack_model,
+            [(slack_logs.channel_logs[channel_name],)
+             for channel_name in channel_names])
+
+    def learn():
+        learn_logs = SlackLogs(export_dir)
+        learn_controller = ModelController(
+            BOT_USER_ID, 'bot', learn_logs, {},
+            chain_backend=parameters['chain_backend'])
+
+        # Logs to a copy of the export, leaving the original untouched.
+        learn_logs.log_writer.slack_log_dir = os.path.join(work_dir, 'learn')
+
+        def learn_message(message, channel_name):
+            learn_controller.update_slack_models(
+                learn_logs, channel_name,
+                [learn_logs.add_to_logs(message, channel_name)])
+
+        def run():
+            try:
+                return timed(learn_message, new_messages)
+            finally:
+                learn_logs.close()
+
+        return run
+
+    def generate():
+        # A new controller, so that every run starts with cold caches.
+        generate_controller = ModelController(
+            BOT_USER_ID, 'bot', slack_logs, {},
+            chain_backend=parameters['chain_backend'])
+
+        return lambda: timed(generate_controller.build_message, requests)
+
+    stages = {}
+
+    for name, stage in (('ingest', ingest),
+                        ('write_logs', write_logs),
+                        ('startup', startup),
+                        ('train_channel', train_channel),
+                        ('learn', learn),
+                        ('generate', generate)):
+        stages[name] = run_stage(stage, measure_memory)
+
+    return stages
+
+
+def compare_results(baseline, results):
+    """Compares results with a baseline run.
+
+    :param baseline: the results of an earlier run.
+    :param results: the results of this run.
+    :returns comparison: a dict of stages to dicts of metrics to their
+        relative change, where positive is better.
+    """
+
+    comparison = {}
+
+    for name, result in results['stages'].items():
+        old = baseline['stages'].get(name)
+
+        if old is None:
+            continue
+
+        changes = {}
+
+        if old['throughput'] and result['throughput']:
+            changes['throughput'] = (
+                result['throughput'] / old['throughput'] - 1)
+
+        if old['latency_ms'] and result['latency_ms']:
+            for key in ('p50', 'p99'):
+                if old['latency_ms'][key]:
+                    changes['latency_' + key] = (
+                        1 - result['latency_ms'][key] /
+                        old['latency_ms'][key])
+
+        if old['peak_memory_bytes'] and result['peak_memory_bytes']:
+            changes['peak_memory'] = (
+                1 - result['peak_memory_bytes'] / old['peak_memory_bytes'])
+
+        comparison[name] = changes
+
+    return comparison
@@ -3,14 +3,22 @@
 import click
 
 from markov_slackbot.main import markov_slackbot
+from markov_slackbot.main import build_snapshot
 from markov_slackbot.main import generate_example_config_file
 from markov_slackbot.main import prepare_environment
+from markov_slackbot.main import migrate_logs
+from markov_slackbot.main import import_logs
+from markov_slackbot.main import benchmark
 
 
 def main():
     cli.add_command(run_bot)
+    cli.add_command(build_model_snapshot)
     cli.add_command(generate_example_config)
     cli.add_command(prepare_env)
+    cli.add_command(migrate_log_files)
+    cli.add_command(import_log_files)
+    cli.add_command(run_benchmark)
     cli()
 
 
@@ -27,6 +35,17 @@ def run_bot(config_file):
     markov_slackbot(config_file)
 
 
+@click.command()
+@click.option('--config_file', default='config.json',
+              help='Configuration filepath.')
+def build_model_snapshot(config_file):
+    """Train the models and save them to the snapshot."""
+    try:
+        build_snapshot(config_file)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+
 @click.command()
 def generate_example_config():
     """Generate an example config file."""
@@ -39,5 +58,70 @@ def prepare_env():
     prepare_environment()
 
 
+@click.command()
+@click.option('--config_file', default='config.json',
+              help='Configuration filepath.')
+def migrate_log_files(config_file):
+    """Convert JSON array logs to line-delimited logs."""
+    migrated = migrate_logs(config_file)
+    click.echo('Migrated {0} log files.'.format(migrated))
+
+
+@click.command()
+@click.option('--config_file', default='config.json',
+              help='Configuration filepath.')
+def import_log_files(config_file):
+    """Load the log directory into the SQLite log database."""
+    imported = import_logs(config_file)
+    click.echo('Imported {0} messages.'.format(imported))
+
+
+@click.command()
+@click.option('--output_file', default=None,
+              help='Path to save the results to as JSON.')
+@click.option('--baseline_file', default=None,
+              help='Results of an earlier run to compare with.')
+@click.option('--export_dir', default=None,
+              help='Directory to write the synthetic export to and keep.')
+@click.option('--channels', default=8, help='Number of channels.')
+@click.option('--users', default=40, help='Number of users.')
+@click.option('--messages', default=20000, help='Number of messages.')
+@click.option('--mean_words', default=10.0,
+              help='Mean number of words in a message.')
+@click.option('--words_sigma', default=0.8,
+              help='Spread of the number of words in a message.')
+@click.option('--vocabulary', default=5000, help='Number of distinct words.')
+@click.option('--seed', default=0, help='Seed of the synthetic export.')
+@click.option('--chain_backend', default='dict',
+              help='Chain backend of the models.')
+@click.option('--requests', default=200, help='Messages to generate.')
+@click.option('--writes', default=2000, help='Messages to log and learn.')
+@click.option('--memory/--no-memory', default=True,
+              help='Measure the peak memory of each stage.')
+def run_benchmark(output_file, baseline_file, memory, **options):
+    """Benchmark ingestion, training and generation."""
+    results, comparison = benchmark(output_file, baseline_file,
+                                    measure_memory=memory, **options)
+
+    for name, result in sorted(results['stages'].items()):
+        line = '{0}: {1} items in {2:.3f}s'.format(
+            name, result['count'], result['seconds'])
+
+        if result['latency_ms']:
+            line += ', p50 {p50:.3f}ms, p99 {p99:.3f}ms'.format(
+                **result['latency_ms'])
+
+        if result['peak_memory_bytes'] is not None:
+            line += ', peak {0:.1f}MB'.format(
+                result['peak_memory_bytes'] / 1024 / 1024)
+
+        if comparison and name in comparison:
+            line += ', ' + ', '.join(
+                '{0} {1:+.1%}'.format(metric, change)
+                for metric, change in sorted(comparison[name].items()))
+
+        click.echo(line)
+
+
 if __name__ == "__main__":
     main()
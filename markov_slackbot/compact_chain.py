@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+import bisect
+from collections.abc import Mapping
+import random
+
+from markovify.chain import BEGIN, END
+
+from markov_slackbot.incremental_text import IncrementalChain, IncrementalText
+
+
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+class Vocabulary(object):
+    """Interns tokens as integer ids so that chains sharing a vocabulary
+    store every distinct word once.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.tokens = []
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, token):
+        """Gets the id of token, adding it to the vocabulary if it is new.
+
+        :param token: the token to intern.
+        :returns token_id: the id of the token.
+        """
+
+        token_id = self.ids.get(token)
+
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+
+        return token_id
+
+
+SHARED_VOCABULARY = Vocabulary()
+
+
+class CompactModelView(Mapping):
+    """A read-only dict of dicts view of a CompactChain, decoded on access,
+    for code that expects a markovify Chain's model.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def __getitem__(self, state):
+        follows, counts = self.chain.lookup(self.chain.encode_state(state))
+        tokens = self.chain.vocabulary.tokens
+
+        return dict((tokens[follow], count)
+                    for follow, count in zip(follows, counts))
+
+    def __iter__(self):
+        self.chain.flush()
+
+        for key in self.chain.states:
+            yield self.chain.decode_state(key)
+
+    def __len__(self):
+        self.chain.flush()
+
+        return len(self.chain.states)
+
+
+class CompactChain(IncrementalChain):
+    """An IncrementalChain storing states and follows as ids from a shared
+    Vocabulary.
+
+    Each state is packed into a single int. Its follows are kept as one
+    array of sorted follow ids followed by their cumulative counts, or as a
+    single int when there is only one follow, which is the common case.
+    Updates are staged in a small dict and merged into the arrays in batches
+    so that states with many follows aren't rewritten for every update.
+    """
+
+    def __init__(self, corpus, state_size, model=None, vocabulary=None,
+                 max_pending=100000):
+        if vocabulary is None:
+            vocabulary = SHARED_VOCABULARY
+
+        self.state_size = state_size
+        self.vocabulary = vocabulary
+        self.max_pending = max_pending
+        self.states = {}
+        self.pending = {}
+        self.pending_size = 0
+        self.vocabulary.intern(BEGIN)
+
+        if model is not None:
+            self.add_counts(model)
+        else:
+            self.build(corpus or [], state_size)
+
+    @property
+    def model(self):
+        return CompactModelView(self)
+
+    def build(self, corpus, state_size):
+        for run in corpus:
+            self.add_run(run)
+
+        self.flush()
+
+        return self.model
+
+    def precompute_begin_state(self):
+        pass
+
+    def encode_state(self, state, intern=False):
+        """Packs a state of tokens into a single int.
+
+        :param state: a tuple of tokens.
+        :param intern: whether to add unknown tokens to the vocabulary.
+        :returns key: the packed state.
+        """
+
+        key = 0
+
+        for i, token in enumerate(state):
+            if intern:
+                token_id = self.vocabulary.intern(token)
+            else:
+                token_id = self.vocabulary.ids[token]
+
+            key |= token_id << (ID_BITS * i)
+
+        return key
+
+    def decode_state(self, key):
+        tokens = self.vocabulary.tokens
+
+        return tuple(tokens[(key >> (ID_BITS * i)) & ID_MASK]
+                     for i in range(self.state_size))
+
+    def unpack(self, value):
+        """Unpacks the follows of a state.
+
+        :param value: the packed follows, or None.
+        :returns follows, counts: lists of follow ids and their counts.
+        """
+
+        if value is None:
+            return [], []
+
+        if isinstance(value, int):
+            return [value >> ID_BITS], [value & ID_MASK]
+
+        size = len(value) // 2
+        cumulative = value[size:]
+        counts = [cumulative[0]] + [b - a for a, b
+                                    in zip(cumulative, cumulative[1:])]
+
+        return list(value[:size]), counts
+
+    def pack(self, follows, counts):
+        """Packs follows sorted by id with their counts.
+
+        :param follows: a sorted list of follow ids.
+        :param counts: the counts of the follows.
+        :returns value: the packed follows.
+        """
+
+        if len(follows) == 1:
+            return (follows[0] << ID_BITS) | counts[0]
+
+        cumulative = []
+        total = 0
+
+        for count in counts:
+            total += count
+            cumulative.append(total)
+
+        return array('I', follows + cumulative)
+
+    def state_count(self):
+        """Counts the states of the chain without merging staged updates,
+        counting every staged state as new.
+        """
+
+        return len(self.states) + len(self.pending)
+
+    def stage(self, key, follow, delta):
+        deltas = self.pending.get(key)
+
+        if deltas is None:
+            deltas = self.pending[key] = {}
+
+        deltas[follow] = deltas.get(follow, 0) + delta
+        self.pending_size += 1
+
+        if self.pending_size >= self.max_pending:
+            self.flush()
+
+    def merge(self, key):
+        """Merges the staged updates of a state into its packed follows.
+
+        :param key: the packed state.
+        """
+
+        follows, counts = self.unpack(self.states.get(key))
+        merged = dict(zip(follows, counts))
+
+        for follow, delta in self.pending.pop(key).items():
+            count = merged.get(follow, 0) + delta
+
+            if count:
+                merged[follow] = count
+            else:
+                merged.pop(follow, None)
+
+        if merged:
+            follows = sorted(merged)
+            self.states[key] = self.pack(
+                follows, [merged[follow] for follow in follows])
+        else:
+            self.states.pop(key, None)
+
+    def flush(self):
+        """Merges every staged update.
+        """
+
+        for key in list(self.pending):
+            self.merge(key)
+
+        # An emptied dict keeps its table, so start a new one.
+        self.pending = {}
+        self.pending_size = 0
+
+    def lookup(self, key):
+        """Gets the follows of a state.
+
+        :param key: the packed state.
+        :returns follows, counts: lists of follow ids and their counts.
+        """
+
+        if key in self.pending:
+            self.merge(key)
+
+        value = self.states.get(key)
+
+        if value is None:
+            raise KeyError(self.decode_state(key))
+
+        return self.unpack(value)
+
+    def add_run(self, run):
+        intern = self.vocabulary.intern
+
+        for state, follow in self.iter_transitions(run):
+            self.stage(self.encode_state(state, intern=True),
+                       intern(follow), 1)
+
+    def remove_run(self, run):
+        for state, follow in self.iter_transitions(run):
+            self.stage(self.encode_state(state),
+                       self.vocabulary.ids[follow], -1)
+
+    def add_counts(self, model, sign=1):
+        intern = self.vocabulary.intern
+
+        for state, follows in model.items():
+            key = self.encode_state(state, intern=True)
+
+            for follow, count in follows.items():
+                self.stage(key, intern(follow), sign * count)
+
+        # Whole chains are added at once, so there is nothing left to batch
+        # with, and staged states take several times the memory of merged
+        # ones.
+        self.flush()
+
+    def move(self, state):
+        """Given a state, choose the next item at random.
+        """
+
+        key = self.encode_state(state)
+
+        if key in self.pending:
+            self.merge(key)
+
+        value = self.states[key]
+
+        if isinstance(value, int):
+            follow = value >> ID_BITS
+        else:
+            size = len(value) // 2
+            r = random.random() * value[-1]
+            follow = value[bisect.bisect(value, r, size, size * 2) - size]
+
+        return self.vocabulary.tokens[follow]
+
+
+class CompactText(IncrementalText):
+    """An IncrementalText backed by a CompactChain.
+
+    It doesn't keep the raw text it learns, and keeps the words of its
+    sentences as ids from the chain's Vocabulary, all in one array with an
+    END id after each sentence, rather than as strings.
+    """
+
+    chain_class = CompactChain
+    keep_input_text = False
+
+    def __init__(self, *args, **kwargs):
+        self._runs = array('I')
+        super().__init__(*args, **kwargs)
+
+    def iter_stored_runs(self):
+        tokens = self.chain.vocabulary.tokens
+        end_id = self.chain.vocabulary.intern(END)
+        run = []
+
+        for token_id in self._runs:
+            if token_id == end_id:
+                yield run
+                run = []
+            else:
+                run.append(tokens[token_id])
+
+    def iter_runs(self):
+        for run in self.iter_stored_runs():
+            yield run
+
+        for run in self._tail_runs:
+            yield run
+
+    def iter_sentences(self):
+        for run in self.iter_stored_runs():
+            yield self.word_join(run)
+
+    def store_runs(self, runs):
+        intern = self.chain.vocabulary.intern
+        end_id = intern(END)
+
+        for run in runs:
+            self._runs.extend(intern(word) for word in run)
+            self._runs.append(end_id)
+
+    def load_sentences(self, sentences):
+        self._runs = array('I')
+        self.store_runs(self.word_split(sentence) for sentence in sentences)
+
+    def text_size(self):
+        return len(self._runs) * self._runs.itemsize
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import random
+
+import markovify
+from markovify.chain import BEGIN, accumulate
+
+
+class CompositeChain(markovify.Chain):
+    """A weighted combination of Markov chains that is never materialized.
+
+    The transitions of a state are summed from the underlying chains when the
+    state is visited, so the composite only costs memory for its list of
+    chains and the cached begin state.
+    """
+
+    def __init__(self, chains, weights, get_version=None):
+        """
+        :param chains: the chains to combine.
+        :param weights: a weight for each chain.
+        :param get_version: returns something that changes whenever the
+            chains do, so the cached begin state can be refreshed.
+        """
+
+        if len(chains) != len(weights):
+            raise ValueError('`chains` and `weights` lengths must be equal.')
+
+        if len(set(chain.state_size for chain in chains)) != 1:
+            raise ValueError('All `chains` must have the same state size.')
+
+        self.chains = chains
+        self.weights = weights
+        self.state_size = chains[0].state_size
+        self.begin_state = tuple([BEGIN] * self.state_size)
+        self.begin_version = None
+        self.begin_choices = None
+        self.begin_cumdist = None
+        self.get_version = get_version
+
+    @property
+    def model(self):
+        """The combined model, built on demand, for code that needs a dict.
+        """
+
+        return markovify.combine(self.chains, self.weights).model
+
+    def transitions(self, state):
+        """Sums the weighted transitions of state over every chain.
+
+        :param state: the state to look up.
+        :returns choices, cumdist: the follows and their cumulative weights.
+        """
+
+        follows = {}
+
+        for chain, weight in zip(self.chains, self.weights):
+            for follow, count in chain.model.get(state, {}).items():
+                follows[follow] = follows.get(follow, 0) + count * weight
+
+        choices, weights = zip(*follows.items())
+
+        return choices, list(accumulate(weights))
+
+    def move(self, state):
+        """Given a state, choose the next item at random.
+        """
+
+        if state == self.begin_state:
+            version = self.get_version() if self.get_version else None
+
+            if self.begin_choices is None or self.begin_version != version:
+                self.begin_choices, self.begin_cumdist = self.transitions(
+                    state)
+                self.begin_version = version
+
+            choices = self.begin_choices
+            cumdist = self.begin_cumdist
+        else:
+            choices, cumdist = self.transitions(state)
+
+        r = random.random() * cumdist[-1]
+
+        return choices[bisect.bisect(cumdist, r)]
+
+
+class CompositeText(markovify.Text):
+    """A weighted combination of markovify Text models that samples from the
+    underlying chains at generation time instead of merging them.
+    """
+
+    def __init__(self, models, weights=None):
+        """
+        :param models: the Text models to combine.
+        :param weights: a weight for each model, 1 for each by default.
+        """
+
+        if weights is None:
+            weights = [1] * len(models)
+
+        self.models = models
+        self.weights = weights
+        self.chain = CompositeChain(
+            [model.chain for model in models],
+            weights,
+            get_version=self.model_versions)
+
+    def model_versions(self):
+        return tuple(getattr(model, 'version', None) for model in self.models)
+
+    @property
+    def input_text(self):
+        return '\n'.join(model.input_text for model in self.models)
+
+    @property
+    def rejoined_text(self):
+        return ' '.join(model.rejoined_text for model in self.models)
+
+    def test_sentence_output(self, words, max_overlap_ratio,
+                             max_overlap_total):
+        """Rejects sentences that too closely match the text of any of the
+        underlying models, the same way markovify does for a single text.
+        """
+
+        for model in self.models:
+            if not model.test_sentence_output(
+                    words, max_overlap_ratio, max_overlap_total):
+                return False
+
+        return True
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Mapping
+import os
+
+
+class ExternalTexts(Mapping):
+    """A read-only dict of the external texts in a directory by name.
+
+    Only the filenames are listed up front. A text is read from disk each
+    time it is looked up, so that it is only held in memory while its model
+    is trained. Texts larger than ``stream_size`` bytes are too large to hold
+    at all, and are read in chunks by text_chunks instead.
+    """
+
+    def __init__(self, external_texts_dir, stream_size=16 * 1024 * 1024,
+                 chunk_size=1024 * 1024):
+        """
+        :param external_texts_dir: directory containing external texts.
+        :param stream_size: the size in bytes above which texts are streamed.
+        :param chunk_size: the number of characters in a streamed chunk.
+        """
+
+        self.external_texts_dir = external_texts_dir
+        self.stream_size = stream_size
+        self.chunk_size = chunk_size
+        self.paths = {}
+
+        for external_text_filename in os.listdir(external_texts_dir):
+            text_name = os.path.splitext(external_text_filename)[0]
+            self.paths[text_name] = os.path.join(
+                external_texts_dir, external_text_filename)
+
+    def __contains__(self, text_name):
+        # Mapping would look the text up, reading it whole.
+        return text_name in self.paths
+
+    def __getitem__(self, text_name):
+        with open(self.paths[text_name], 'r') as external_text_file:
+            return external_text_file.read()
+
+    def text_chunks(self, text_name):
+        """Reads a text in chunks if it is too large to read whole.
+
+        :param text_name: the name of the text.
+        :returns chunks: an iterator of chunks of the text, or None if the
+            text should be read whole.
+        """
+
+        path = self.paths[text_name]
+
+        if os.path.getsize(path) <= self.stream_size:
+            return None
+
+        return self.iter_chunks(path)
+
+    def iter_chunks(self, path):
+        with open(path, 'r') as external_text_file:
+            while True:
+                chunk = external_text_file.read(self.chunk_size)
+
+                if not chunk:
+                    return
+
+                yield chunk
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
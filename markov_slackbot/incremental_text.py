@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import random
+import re
+
+import markovify
+from markovify.chain import BEGIN, END, accumulate
+from markovify.splitters import is_sentence_ender
+
+from markov_slackbot.composite_text import CompositeText
+from markov_slackbot.ngram_index import NgramIndex
+
+
+# Rough CPython cost of one character of text kept for the novelty test and
+# for snapshots.
+BYTES_PER_CHARACTER = 2
+
+# The same pattern markovify.splitters.split_into_sentences uses, kept here so
+# that sentence boundaries can be located and not just the sentences.
+SENTENCE_END_PATTERN = re.compile(r"".join([
+    r"([\w\.'’&\]\)]+[\.\?!])",
+    r"([‘’“”'\"\)\]]*)",
+    r"(\s+(?![a-z\-–—]))",
+]), re.U)
+
+
+def split_into_sentence_spans(text):
+    """Splits text into sentences the same way markovify does.
+
+    Boundaries whose match runs to the very end of the text may still move
+    once more text is appended, so the last boundary that can no longer
+    change is returned alongside the sentences.
+
+    :param text: the text to split.
+    :returns sentences, stable_end: the sentences and the index after which
+        everything may still change.
+    """
+
+    end_indices = []
+    stable_end = 0
+
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        if not is_sentence_ender(match.group(1)):
+            continue
+
+        end_index = match.start() + len(match.group(1)) + len(match.group(2))
+        end_indices.append(end_index)
+
+        if match.end() < len(text):
+            stable_end = end_index
+
+    spans = zip([None] + end_indices, end_indices + [None])
+    sentences = [(start or 0, text[start:end].strip())
+                 for start, end in spans]
+
+    return sentences, stable_end
+
+
+def overlap_grams(words, max_overlap_ratio, max_overlap_total):
+    """Gets the runs of words markovify's novelty test looks for in the
+    training text.
+
+    :param words: the words of a generated sentence.
+    :returns grams: the runs of words that mustn't occur in the text.
+    """
+
+    overlap_ratio = int(round(max_overlap_ratio * len(words)))
+    overlap_max = min(max_overlap_total, overlap_ratio)
+    overlap_over = overlap_max + 1
+    gram_count = max((len(words) - overlap_max), 1)
+
+    return [words[i:i + overlap_over] for i in range(gram_count)]
+
+
+def index_runs(models, capacity=None):
+    """Builds an NgramIndex of the learned text of some models, with room for
+    as much again.
+
+    :param models: an iterable of IncrementalText models.
+    :param capacity: the number of runs to size the index for, if known, so
+        that models are only gone through once and can be dropped as soon as
+        they are indexed.
+    :returns ngram_index: the NgramIndex.
+    """
+
+    if capacity is None:
+        models = list(models)
+        ngram_index = NgramIndex()
+        capacity = sum(ngram_index.count_ngrams(len(run))
+                       for model in models for run in model.iter_runs()) * 2
+
+    ngram_index = NgramIndex(capacity=max(capacity, 1 << 12))
+
+    for model in models:
+        for run in model.iter_runs():
+            ngram_index.add(run)
+
+    return ngram_index
+
+
+def test_ngram_novelty(model, words, max_overlap_ratio, max_overlap_total):
+    """Rejects sentences that too closely match the learned text of a model,
+    testing the same runs of words as markovify, but looking them up in the
+    model's NgramIndex instead of searching its text, with the differences
+    described there.
+
+    :param model: a model with an ngram_index.
+    :param words: the words of a generated sentence.
+    :returns novel: whether the sentence passes.
+    """
+
+    grams = overlap_grams(words, max_overlap_ratio, max_overlap_total)
+
+    if len(grams[0]) > model.ngram_index.max_length:
+        return markovify.Text.test_sentence_output(
+            model, words, max_overlap_ratio, max_overlap_total)
+
+    return not any(gram in model.ngram_index for gram in grams)
+
+
+class IncrementalChain(markovify.Chain):
+    """A markovify Chain whose transition counts can be updated in place.
+    """
+
+    def __init__(self, corpus, state_size, model=None):
+        self.state_size = state_size
+        self.model = model if model is not None else self.build(
+            corpus, state_size)
+        self.precompute_begin_state()
+
+    def build(self, corpus, state_size):
+        """Builds the chain, tolerating an empty corpus.
+
+        :param corpus: a list of runs.
+        :param state_size: the number of words in a state.
+        :returns model: a dict of states to dicts of follow counts.
+        """
+
+        self.model = {}
+        self.state_size = state_size
+
+        for run in corpus:
+            self.add_run(run)
+
+        return self.model
+
+    def precompute_begin_state(self):
+        """Invalidates the cached begin state, it is recomputed on demand.
+        """
+
+        self.begin_choices = None
+        self.begin_cumdist = None
+
+    def state_count(self):
+        """Counts the states of the chain, for estimating its size.
+        """
+
+        return len(self.model)
+
+    def iter_transitions(self, run):
+        """Yields every (state, follow) pair in a run.
+
+        :param run: a list of words.
+        """
+
+        items = ([BEGIN] * self.state_size) + run + [END]
+
+        for i in range(len(run) + 1):
+            state = tuple(items[i:i + self.state_size])
+            yield state, items[i + self.state_size]
+
+    def add_run(self, run):
+        """Adds the transitions of a run to the chain.
+
+        :param run: a list of words.
+        """
+
+        for state, follow in self.iter_transitions(run):
+            follows = self.model.get(state)
+
+            if follows is None:
+                follows = self.model[state] = {}
+
+            follows[follow] = follows.get(follow, 0) + 1
+
+            if state[0] == BEGIN:
+                self.precompute_begin_state()
+
+    def remove_run(self, run):
+        """Removes the transitions of a previously added run from the chain.
+
+        :param run: a list of words.
+        """
+
+        for state, follow in self.iter_transitions(run):
+            follows = self.model[state]
+            follows[follow] -= 1
+
+            if not follows[follow]:
+                del follows[follow]
+
+                if not follows:
+                    del self.model[state]
+
+            if state[0] == BEGIN:
+                self.precompute_begin_state()
+
+    def add_counts(self, model, sign=1):
+        """Adds, or with a negative sign subtracts, the transition counts of
+        another chain's model to this chain.
+
+        :param model: a dict of states to dicts of follow counts.
+        :param sign: 1 to add the counts, -1 to subtract them.
+        """
+
+        for state, other_follows in model.items():
+            follows = self.model.get(state)
+
+            if follows is None:
+                follows = self.model[state] = {}
+
+            for follow, count in other_follows.items():
+                total = follows.get(follow, 0) + sign * count
+
+                if total:
+                    follows[follow] = total
+                else:
+                    del follows[follow]
+
+            if not follows:
+                del self.model[state]
+
+        self.precompute_begin_state()
+
+    def move(self, state):
+        """Given a state, choose the next item at random.
+        """
+
+        if state == tuple([BEGIN] * self.state_size):
+            if self.begin_choices is None:
+                choices, weights = zip(*self.model[state].items())
+                self.begin_cumdist = list(accumulate(weights))
+                self.begin_choices = choices
+
+            choices = self.begin_choices
+            cumdist = self.begin_cumdist
+        else:
+            choices, weights = zip(*self.model[state].items())
+            cumdist = list(accumulate(weights))
+
+        r = random.random() * cumdist[-1]
+
+        return choices[bisect.bisect(cumdist, r)]
+
+
+class IncrementalText(markovify.Text):
+    """A markovify Text that can learn more text without retraining.
+
+    Appending text only re-splits the trailing sentence of what was learned
+    before, so the resulting chain is the one a full retrain on the
+    concatenated text would produce. That also makes it possible to train on
+    a text read a chunk at a time.
+
+    Like later versions of markovify, a model made with retain_original off
+    keeps none of the text it learns, only the chain, and skips the novelty
+    test for want of text to test against.
+    """
+
+    chain_class = IncrementalChain
+
+    # Whether to keep the raw text learned, as well as its sentences.
+    keep_input_text = True
+
+    def __init__(self, input_text, state_size=2, chain=None,
+                 retain_original=True):
+        self.retain_original = retain_original
+        self._input_parts = []
+        self._input_text = None
+        self._sentences = []
+        self._rejoined_text = None
+        self._tail = ''
+        self._tail_runs = []
+        self._ngram_index = None
+        self.version = 0
+
+        if chain is not None:
+            self.chain = chain
+        else:
+            self.chain = self.chain_class([], state_size)
+
+        self.add_text(input_text, train=chain is None)
+
+    @property
+    def input_text(self):
+        """The raw text learned, or its sentences when it isn't kept.
+        """
+
+        if not self.keep_input_text:
+            return self.rejoined_text
+
+        if self._input_text is None:
+            self._input_text = ''.join(self._input_parts)
+        return self._input_text
+
+    @property
+    def rejoined_text(self):
+        if self._rejoined_text is None:
+            tail_sentences = [self.word_join(run) for run in self._tail_runs]
+            self._rejoined_text = self.sentence_join(
+                list(self.iter_sentences()) + tail_sentences)
+        return self._rejoined_text
+
+    @property
+    def ngram_index(self):
+        """The NgramIndex of the learned text, built the first time it is
+        needed and then kept up to date by add_text.
+        """
+
+        if self._ngram_index is None or self._ngram_index.is_full():
+            self._ngram_index = index_runs([self])
+
+        return self._ngram_index
+
+    def iter_runs(self):
+        """Yields the words of every learned sentence.
+        """
+
+        for sentence in self._sentences:
+            yield self.word_split(sentence)
+
+        for run in self._tail_runs:
+            yield run
+
+    def iter_sentences(self):
+        """Yields every learned sentence that can no longer change.
+        """
+
+        return iter(self._sentences)
+
+    def store_runs(self, runs):
+        """Keeps the words of sentences that can no longer change.
+
+        :param runs: the words of each sentence.
+        """
+
+        self._sentences.extend(self.word_join(run) for run in runs)
+
+    def load_sentences(self, sentences):
+        self._sentences = sentences
+
+    def text_size(self):
+        """Estimates the memory used by the text the model keeps.
+
+        :returns size: the estimated size in bytes.
+        """
+
+        return (sum(len(part) for part in self._input_parts) +
+                sum(len(sentence) for sentence in self._sentences)
+                ) * BYTES_PER_CHARACTER
+
+    def test_sentence_output(self, words, max_overlap_ratio,
+                             max_overlap_total):
+        if not self.retain_original:
+            return True
+
+        return test_ngram_novelty(
+            self, words, max_overlap_ratio, max_overlap_total)
+
+    def is_empty(self):
+        """Whether the model has learned anything it can generate from.
+        """
+
+        return not self.chain.model
+
+    def add_text(self, text, separator='', train=True):
+        """Learns text appended to everything learned so far.
+
+        :param text: the text to learn.
+        :param separator: joins text to previously learned text, if any.
+        :param train: whether to update the chain.
+        :returns removed_runs, added_runs: the runs taken out of and put into
+            the chain, so other chains can be kept in step.
+        """
+
+        if self.version:
+            text = separator + text
+
+        if self.retain_original and self.keep_input_text:
+            self._input_parts.append(text)
+
+        self._input_text = None
+        self._rejoined_text = None
+        self.version += 1
+
+        sentences, stable_end = split_into_sentence_spans(self._tail + text)
+
+        stable_runs = []
+        tail_runs = []
+
+        for start, sentence in sentences:
+            if not self.test_sentence_input(sentence):
+                continue
+
+            run = self.word_split(sentence)
+
+            if start < stable_end:
+                stable_runs.append(run)
+            else:
+                tail_runs.append(run)
+
+        removed_runs = self._tail_runs
+        added_runs = stable_runs + tail_runs
+
+        if train:
+            for run in removed_runs:
+                self.chain.remove_run(run)
+
+            for run in added_runs:
+                self.chain.add_run(run)
+
+        if self.retain_original:
+            self.store_runs(stable_runs)
+
+        self._tail = (self._tail + text)[stable_end:]
+        self._tail_runs = tail_runs
+
+        if self._ngram_index is not None:
+            for run in added_runs:
+                self._ngram_index.add(run)
+
+        return removed_runs, added_runs
+
+    def to_dict(self):
+        """Dumps the model as a JSON serializable dict, for loading later.
+
+        :returns model_dict: a dict of everything the model has learned.
+        """
+
+        return {
+            'state_size': self.chain.state_size,
+            'chain': list(self.chain.model.items()),
+            'retain_original': self.retain_original,
+            'has_text': bool(self._input_parts),
+            'input_text': ''.join(self._input_parts),
+            'sentences': list(self.iter_sentences()),
+            'tail': self._tail,
+            'tail_runs': self._tail_runs,
+        }
+
+    @classmethod
+    def from_dict(cls, model_dict):
+        """Loads a model dumped by to_dict.
+
+        :param model_dict: a dict created by to_dict.
+        :returns model: the model.
+        """
+
+        chain = cls.chain_class(
+            None,
+            model_dict['state_size'],
+            model=dict((tuple(state), follows)
+                       for state, follows in model_dict['chain']))
+
+        model = cls('', chain=chain,
+                    retain_original=model_dict.get('retain_original', True))
+
+        if model_dict['has_text'] and cls.keep_input_text:
+            model._input_parts = [model_dict['input_text']]
+        else:
+            model._input_parts = []
+
+        model.load_sentences(model_dict['sentences'])
+        model._tail = model_dict['tail']
+        model._tail_runs = model_dict['tail_runs']
+
+        return model
+
+
+class AggregateText(CompositeText):
+    """The sum of several IncrementalText models, such as every channel model
+    making up the master model.
+
+    The summed transition counts are kept in a single chain for fast
+    generation, and the text of the underlying models in a single NgramIndex
+    for the novelty test. A model can be detached to stop holding on to it
+    while its counts and text stay in the sum.
+    """
+
+    def __init__(self, models, state_size=2, chain_class=IncrementalChain):
+        """
+        :param models: the IncrementalText models to sum.
+        :param state_size: the state size of the models.
+        :param chain_class: the class of the summed chain.
+        """
+
+        self.models = []
+        self.weights = []
+        self.version = 0
+        self.chain = chain_class([], state_size)
+        self._ngram_index = None
+
+        # Returns an iterator of every model of the sum, detached ones
+        # included, for reindex to rebuild a full NgramIndex from.
+        self.load_models = None
+
+        for model in models:
+            self.add_model(model)
+
+    @property
+    def ngram_index(self):
+        """The NgramIndex of the text of every model in the sum.
+
+        With load_models, a full index stays in use until reindex replaces
+        it, as rebuilding it means going through detached models too.
+        """
+
+        if self._ngram_index is None:
+            self._ngram_index = index_runs(self.models)
+        elif self._ngram_index.is_full() and self.load_models is None:
+            self._ngram_index = index_runs(self.models)
+
+        return self._ngram_index
+
+    def needs_reindex(self):
+        """Whether the NgramIndex is full and waiting for reindex.
+        """
+
+        return (self.load_models is not None and
+                self._ngram_index is not None and
+                self._ngram_index.is_full())
+
+    def reindex(self):
+        """Rebuilds a full NgramIndex from load_models with room to grow,
+        swapping it in once it is built so that the full one serves the
+        novelty test until then.
+
+        Loading the models can take as long as training them, so this is
+        left to the owner of the sum to call where it holds nothing up, and
+        not while the models are learning.
+        """
+
+        ngram_index = index_runs(self.load_models(),
+                                 capacity=self._ngram_index.count * 2)
+        self._ngram_index = ngram_index
+
+    def test_sentence_output(self, words, max_overlap_ratio,
+                             max_overlap_total):
+        return test_ngram_novelty(
+            self, words, max_overlap_ratio, max_overlap_total)
+
+    def is_empty(self):
+        """Whether the sum has learned anything it can generate from.
+        """
+
+        return not self.chain.model
+
+    def add_model(self, model):
+        """Adds a model to the sum.
+
+        :param model: the IncrementalText to add.
+        """
+
+        self.models.append(model)
+        self.weights.append(1)
+        self.chain.add_counts(model.chain.model)
+        self.version += 1
+
+        if self._ngram_index is not None:
+            for run in model.iter_runs():
+                self._ngram_index.add(run)
+
+    def remove_model(self, model):
+        """Removes a model from the sum, detached or not.
+
+        The NgramIndex can't forget the text of the model, which only makes
+        the novelty test stricter.
+
+        :param model: the IncrementalText to remove.
+        """
+
+        for i, existing_model in enumerate(self.models):
+            if existing_model is model:
+                del self.models[i]
+                del self.weights[i]
+                break
+
+        self.chain.add_counts(model.chain.model, sign=-1)
+        self.version += 1
+
+    def detach_model(self, model):
+        """Stops holding on to a model while keeping it in the sum.
+
+        :param model: the IncrementalText to detach.
+        """
+
+        for i, existing_model in enumerate(self.models):
+            if existing_model is model:
+                # Index the text of the model while it is still at hand.
+                if self._ngram_index is None:
+                    self._ngram_index = index_runs(self.models)
+
+                del self.models[i]
+                del self.weights[i]
+                return
+
+    def replace_model(self, old_model, new_model):
+        """Swaps one model of the sum for another.
+
+        :param old_model: the model to remove, or None.
+        :param new_model: the model to add, or None.
+        """
+
+        if old_model is new_model:
+            return
+
+        if old_model is not None:
+            self.remove_model(old_model)
+
+        if new_model is not None:
+            self.add_model(new_model)
+
+    def apply(self, removed_runs, added_runs):
+        """Applies a change made to one of the underlying models.
+
+        :param removed_runs: the runs removed from that model.
+        :param added_runs: the runs added to that model.
+        """
+
+        for run in removed_runs:
+            self.chain.remove_run(run)
+
+        for run in added_runs:
+            self.chain.add_run(run)
+
+        if self._ngram_index is not None:
+            for run in added_runs:
+                self._ngram_index.add(run)
+
+        self.version += 1
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import logging
+import os
+import time
+
+
+LOG_EXTENSION = '.jsonl'
+
+
+class LogWriter(object):
+    """Appends messages to line-delimited daily log files.
+
+    Each message is written as one line of JSON to
+    ``<slack_log_dir>/<channel>/<date>.jsonl``. Writes are buffered and
+    flushed every ``flush_every`` messages or every ``flush_interval``
+    seconds, whichever comes first, and optionally fsynced.
+    """
+
+    def __init__(self, slack_log_dir, flush_every=1, flush_interval=0,
+                 fsync=False):
+        self.logger = logging.getLogger(__name__)
+        self.slack_log_dir = slack_log_dir
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.log_files = {}
+        self.log_date = None
+        self.pending = 0
+        self.last_flush = time.time()
+
+    def write(self, message, channel_name):
+        """Appends a message to today's log file for channel_name.
+
+        :param message: the message to log.
+        :param channel_name: the name of the channel the message was sent to.
+        """
+
+        log_file = self.get_log_file(channel_name)
+        log_file.write(json.dumps(message) + '\n')
+
+        self.pending += 1
+
+        if self.pending >= self.flush_every:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def get_log_file(self, channel_name):
+        """Gets the open log file for channel_name, rolling over to new files
+        when the date changes.
+
+        :param channel_name: the name of the channel.
+        :returns log_file: a file open for appending.
+        """
+
+        today = datetime.date.today()
+
+        if today != self.log_date:
+            self.close()
+            self.log_date = today
+
+        log_file = self.log_files.get(channel_name)
+
+        if log_file is None:
+            channel_dir = os.path.join(self.slack_log_dir, channel_name)
+
+            if not os.path.exists(channel_dir):
+                os.makedirs(channel_dir)
+
+            file_path = os.path.join(
+                channel_dir, today.isoformat() + LOG_EXTENSION)
+
+            log_file = open(file_path, 'a')
+            self.log_files[channel_name] = log_file
+
+        return log_file
+
+    def flush_if_due(self):
+        """Flushes buffered messages if flush_interval has passed.
+        """
+
+        elapsed = time.time() - self.last_flush
+
+        if self.pending and elapsed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Flushes buffered messages to disk.
+        """
+
+        for log_file in self.log_files.values():
+            log_file.flush()
+
+            if self.fsync:
+                os.fsync(log_file.fileno())
+
+        self.pending = 0
+        self.last_flush = time.time()
+
+    def close(self):
+        """Flushes and closes all open log files.
+        """
+
+        self.flush()
+
+        for log_file in self.log_files.values():
+            log_file.close()
+
+        self.log_files = {}
+
+
+def migrate_log_directory(slack_log_dir):
+    """Converts every legacy JSON array log file in slack_log_dir to the
+    line-delimited format, keeping any messages already appended to the
+    line-delimited file for the same day after the legacy ones.
+
+    :param slack_log_dir: directory containing slack log folders.
+    :returns migrated: the number of files migrated.
+    """
+
+    logger = logging.getLogger(__name__)
+    migrated = 0
+
+    for channel_dir in sorted(os.listdir(slack_log_dir)):
+        channel_path = os.path.join(slack_log_dir, channel_dir)
+
+        for log_filename in sorted(os.listdir(channel_path)):
+            log_name, extension = os.path.splitext(log_filename)
+
+            if extension != '.json':
+                continue
+
+            legacy_path = os.path.join(channel_path, log_filename)
+            new_path = os.path.join(channel_path, log_name + LOG_EXTENSION)
+            temporary_path = new_path + '.tmp'
+
+            logger.info('Migrating {0}'.format(legacy_path))
+
+            with open(legacy_path, 'r') as legacy_file:
+                log_text = legacy_file.read()
+
+            log = json.loads(log_text) if log_text.strip() else []
+
+            with open(temporary_path, 'w') as temporary_file:
+                for message in log:
+                    temporary_file.write(json.dumps(message) + '\n')
+
+                if os.path.isfile(new_path):
+                    with open(new_path, 'r') as new_file:
+                        for line in new_file:
+                            temporary_file.write(line)
+
+            os.replace(temporary_path, new_path)
+            os.remove(legacy_path)
+
+            migrated += 1
+
+    return migrated
@@ -3,7 +3,10 @@
 import json
 from os import path, makedirs, walk
 
+from markov_slackbot.benchmark import compare_results, run_benchmark
+from markov_slackbot.log_writer import migrate_log_directory
 from markov_slackbot.markov_slackbot import MarkovSlackbot
+from markov_slackbot.sqlite_logs import SqliteLogs
 
 
 def markov_slackbot(config_file):
@@ -18,8 +21,30 @@ def markov_slackbot(config_file):
     markov_slackbot.start()
 
 
+def build_snapshot(config_file):
+    """Train every model and save them to the configured snapshot.
+
+    :param config_file: User configuration path file.
+    :raises ValueError: if no model_snapshot_dir is configured.
+    """
+
+    config = json.loads(open(config_file).read())
+
+    # Fail before reading every log, which takes a while.
+    if not config.get('model_snapshot_dir'):
+        raise ValueError(
+            'No model_snapshot_dir is configured in {0}.'.format(
+                config_file))
+
+    markov_slackbot = MarkovSlackbot(config)
+    markov_slackbot.build_snapshot()
+
+
 def generate_example_config_file():
     """Create an example config file.
+
+    Every setting is at its default, so the example runs the bot the way it
+    runs without one. The settings worth opting into are in the usage docs.
     """
 
     example_config = {
@@ -29,7 +54,38 @@ def generate_example_config_file():
         'external_texts_dir': 'external_texts',
         'send_mentions': False,
         'LOG_LEVEL': 'DEBUG',
-        'SILENT_CHANNELS_FILE': 'silent_channels.json'
+        'SILENT_CHANNELS_FILE': 'silent_channels.json',
+        'metrics_interval': 300,
+        'log_flush_every': 1,
+        'log_flush_interval': 0,
+        'log_fsync': False,
+        'log_backend': 'files',
+        'log_database': 'slack_logs.db',
+        'log_read_workers': 1,
+        'log_read_executor': 'thread',
+        'model_snapshot_dir': None,
+        'runtime': 'sync',
+        'send_rate': 1.0,
+        'send_burst': 4,
+        'send_channel_rate': 1.0,
+        'send_channel_burst': 2,
+        'send_max_retries': 5,
+        'send_queue_size': 1000,
+        'async_workers': 4,
+        'combined_model_cache_mb': 64,
+        'model_cache_mb': 0,
+        'external_text_stream_mb': 16,
+        'chain_backend': 'dict',
+        'training_processes': 1,
+        'training_queue_size': 1000,
+        'training_queue_timeout': 1.0,
+        'training_batch_size': 50,
+        'training_batch_interval': 1.0,
+        'training_max_staleness': 5.0,
+        'sentence_pool_size': 0,
+        'sentence_pool_refill_threshold': 5,
+        'sentence_pool_models': 16,
+        'sentence_pool_max_age': 300
     }
 
     example_config_json = json.dumps(example_config, sort_keys=True, indent=4)
@@ -51,3 +107,57 @@ def prepare_environment():
         makedirs('external_texts')
 
     generate_example_config_file()
+
+
+def migrate_logs(config_file):
+    """Convert legacy JSON array logs to line-delimited logs.
+
+    :param config_file: User configuration path file.
+    :returns migrated: the number of files migrated.
+    """
+
+    config = json.loads(open(config_file).read())
+
+    return migrate_log_directory(config.get('slack_log_dir'))
+
+
+def import_logs(config_file):
+    """Bulk load the slack log directory into the configured database.
+
+    :param config_file: User configuration path file.
+    :returns imported: the number of messages imported.
+    """
+
+    config = json.loads(open(config_file).read())
+
+    logs = SqliteLogs(config.get('log_database', 'slack_logs.db'))
+    imported = logs.import_log_directory(config.get('slack_log_dir'))
+    logs.close()
+
+    return imported
+
+
+def benchmark(output_file=None, baseline_file=None, **options):
+    """Benchmark ingestion, training and generation on a synthetic export.
+
+    :param output_file: a path to save the results to as JSON.
+    :param baseline_file: a path to the results of an earlier run to
+        compare with.
+    :param options: the options of run_benchmark.
+    :returns results, comparison: the results, and their relative change
+        from the baseline, or None without one.
+    """
+
+    results = run_benchmark(**options)
+    comparison = None
+
+    if baseline_file is not None:
+        baseline = json.loads(open(baseline_file).read())
+        comparison = compare_results(baseline, results)
+        results['baseline'] = comparison
+
+    if output_file is not None:
+        with open(output_file, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+
+    return results, comparison
@@ -8,9 +8,17 @@ import time
 
 from slackclient import SlackClient
 
+import markov_slackbot.async_runtime as async_runtime
+import markov_slackbot.external_texts as external_texts
 import markov_slackbot.model_controller as model_controller
+import markov_slackbot.model_snapshot as model_snapshot
+import markov_slackbot.name_index as name_index
 import markov_slackbot.message_interpreter as message_interpreter
+import markov_slackbot.message_sender as message_sender
+import markov_slackbot.sentence_pool as sentence_pool
 import markov_slackbot.slack_logs as slack_logs
+import markov_slackbot.sqlite_logs as sqlite_logs
+import markov_slackbot.training_worker as training_worker
 
 
 class MarkovSlackbot(object):
@@ -23,26 +31,99 @@ class MarkovSlackbot(object):
 
         self.logger = logging.getLogger(__name__)
         self.last_ping = 0
+        self.last_metrics = 0
         self.commands = self.build_commands()
+        self.model_controller = None
+        self.message_interpreter = None
+        self.training_worker = None
+        self.sentence_pool = None
 
         log_level = config.get('LOG_LEVEL')
         log_level_name = logging.getLevelName(log_level)
         logging.basicConfig(level=log_level_name)
 
+        self.combined_model_cache_size = int(
+            config.get('combined_model_cache_mb', 64) * 1024 * 1024)
+        self.model_cache_size = int(
+            config.get('model_cache_mb', 0) * 1024 * 1024)
+
+        self.metrics_interval = config.get('metrics_interval', 300)
+        self.runtime = config.get('runtime', 'sync')
+        self.async_workers = config.get('async_workers', 4)
+        self.chain_backend = config.get('chain_backend', 'dict')
+        self.training_processes = config.get('training_processes', 1)
+        self.training_queue_size = config.get('training_queue_size', 1000)
+        self.training_queue_timeout = config.get(
+            'training_queue_timeout', 1.0)
+        self.training_batch_size = config.get('training_batch_size', 50)
+        self.training_batch_interval = config.get(
+            'training_batch_interval', 1.0)
+        self.training_max_staleness = config.get(
+            'training_max_staleness', 5.0)
+        self.sentence_pool_size = config.get('sentence_pool_size', 0)
+        self.sentence_pool_refill_threshold = config.get(
+            'sentence_pool_refill_threshold', 5)
+        self.sentence_pool_models = config.get('sentence_pool_models', 16)
+        self.sentence_pool_max_age = config.get('sentence_pool_max_age', 300)
+
         self.token = config.get('SLACK_TOKEN')
         self.slack_log_dir = config.get('slack_log_dir')
         self.send_mentions = config.get('mentions')
 
         external_texts_dir = config.get('external_texts_dir')
-        self.external_texts = self.load_external_texts(external_texts_dir)
+        self.external_texts = self.load_external_texts(
+            external_texts_dir,
+            int(config.get('external_text_stream_mb', 16) * 1024 * 1024))
+
+        self.slack_logs = self.open_slack_logs(config)
+
+        snapshot_dir = config.get('model_snapshot_dir')
 
-        self.slack_logs = slack_logs.SlackLogs(self.slack_log_dir)
+        if snapshot_dir:
+            self.snapshot = model_snapshot.ModelSnapshot(
+                snapshot_dir,
+                external_texts_dir)
+        else:
+            self.snapshot = None
 
         self.silent_channels_file = config.get('SILENT_CHANNELS_FILE')
         self.silent_channels = self.get_silent_channels(
             self.silent_channels_file)
 
         self.slack_client = SlackClient(self.token)
+        self.name_index = name_index.NameIndex()
+
+        self.message_sender = message_sender.MessageSender(
+            self.slack_client.rtm_send_message,
+            rate=config.get('send_rate', 1.0),
+            burst=config.get('send_burst', 4),
+            channel_rate=config.get('send_channel_rate', 1.0),
+            channel_burst=config.get('send_channel_burst', 2),
+            max_retries=config.get('send_max_retries', 5),
+            max_queue_size=config.get('send_queue_size', 1000))
+
+    def open_slack_logs(self, config):
+        """Opens the configured slack log store.
+
+        :param config: the bot's configuration.
+        :returns slack_logs: a SlackLogs or SqliteLogs.
+        """
+
+        log_options = {
+            'flush_every': config.get('log_flush_every', 1),
+            'flush_interval': config.get('log_flush_interval', 0),
+            'fsync': config.get('log_fsync', False),
+        }
+
+        if config.get('log_backend', 'files') == 'sqlite':
+            return sqlite_logs.SqliteLogs(
+                config.get('log_database', 'slack_logs.db'), **log_options)
+
+        return slack_logs.SlackLogs(
+            self.slack_log_dir,
+            read_workers=config.get('log_read_workers', 1),
+            read_executor=config.get('log_read_executor', 'thread'),
+            **log_options)
 
     def build_commands(self):
         return {
@@ -60,61 +141,99 @@ class MarkovSlackbot(object):
 
         return silent_channels
 
-    def load_external_texts(self, external_texts_dir):
+    def load_external_texts(self, external_texts_dir, stream_size):
         """Load external texts.
 
         :param external_texts_dir: directory containing external texts.
-        :returns external_texts: a dict containing the external texts.
+        :param stream_size: the size in bytes above which a text is streamed
+            instead of read whole.
+        :returns external_texts: a dict of the external texts, read from
+            disk when they are looked up.
         """
 
         self.logger.info(
-            'Loading external texts from {0}'.format(external_texts_dir))
-
-        external_texts = {}
-
-        for external_text_filename in os.listdir(external_texts_dir):
-            external_text_filepath = os.path.join(
-                external_texts_dir,
-                external_text_filename)
+            'Listing external texts in {0}'.format(external_texts_dir))
 
-            with open(external_text_filepath, 'r') as external_text_file:
-                text_name = os.path.splitext(external_text_filename)[0]
-                external_texts[text_name] = external_text_file.read()
-
-        return external_texts
+        return external_texts.ExternalTexts(
+            external_texts_dir, stream_size=stream_size)
 
     def start(self):
         """Start the bot.
         """
 
-        while True:
-            try:
-                self.main_loop()
+        try:
+            while True:
+                try:
+                    if self.runtime == 'async':
+                        self.run_async()
+                    else:
+                        self.main_loop()
 
-            except Exception:
-                self.logger.exception('Fatal error in main loop, restarting.')
+                except Exception:
+                    self.logger.exception(
+                        'Fatal error in main loop, restarting.')
+        finally:
+            self.message_sender.stop()
 
-    def main_loop(self):
-        """The main loop for the bot.
-        """
+            if self.sentence_pool is not None:
+                self.sentence_pool.stop()
 
-        self.logger.info('Connecting to Slack.')
-        self.slack_client.rtm_connect()
+            if self.training_worker is not None:
+                self.training_worker.stop()
 
-        self.logger.info('Setting user info.')
-        self.set_user_info()
+            # Saving fingerprints the logs, so the store must still be open.
+            if self.model_controller is not None:
+                self.model_controller.save_snapshot(self.slack_logs)
+
+            self.slack_logs.close()
+
+    def build_snapshot(self):
+        """Train models and save them to the snapshot without starting the
+        bot.
+
+        :raises ValueError: if no model_snapshot_dir is configured.
+        """
 
-        self.model_controller = model_controller.ModelController(
+        try:
+            if self.snapshot is None:
+                raise ValueError(
+                    'No model_snapshot_dir is configured to build.')
+
+            identity = self.slack_client.api_call('auth.test')
+            self.user_id = identity['user_id']
+            self.username = identity['user']
+
+            self.model_controller = self.build_model_controller()
+
+            # External models are otherwise only trained when first asked
+            # for.
+            self.model_controller.save_snapshot(
+                self.slack_logs, train_external=True)
+        finally:
+            self.slack_logs.close()
+
+    def build_model_controller(self):
+        """Build the model controller, loading models from the snapshot if
+        there is one.
+        """
+
+        return model_controller.ModelController(
             self.user_id,
             self.username,
             self.slack_logs,
-            self.external_texts)
+            self.external_texts,
+            snapshot=self.snapshot,
+            combined_model_cache_size=self.combined_model_cache_size,
+            chain_backend=self.chain_backend,
+            training_processes=self.training_processes,
+            model_cache_size=self.model_cache_size)
 
-        self.message_interpreter = message_interpreter.MessageInterpreter(
-            self.user_id,
-            self.username,
-            self.commands.keys(),
-            self.external_texts.keys())
+    def main_loop(self):
+        """The main loop for the bot.
+        """
+
+        self.connect()
+        self.start_services()
 
         self.logger.info('Bot running.')
 
@@ -123,29 +242,102 @@ class MarkovSlackbot(object):
             messages = self.slack_client.rtm_read()
 
             for message in messages:
-                self.logger.debug('Retrieved message: {0}'.format(message))
+                self.handle_message(message)
+
+            self.autoping()
+            self.report_metrics()
+            time.sleep(.1)
+
+    def run_async(self):
+        """The asyncio runtime for the bot, in place of main_loop.
+        """
 
-                if (self.message_interpreter.is_respondable(message)):
-                    self.logger.debug('Message was respondable, responding.')
-                    self.respond(message)
+        async_runtime.AsyncRuntime(self, workers=self.async_workers).run()
 
-                elif (self.model_controller.is_learnable(message)):
-                    self.logger.debug('Message was learnable.')
+    def connect(self):
+        """Connects to Slack.
+        """
 
-                    channel_name = self.get_channel_name(
-                        message.get('channel'))
+        self.logger.info('Connecting to Slack.')
+        self.slack_client.rtm_connect()
 
-                    self.logger.debug('Adding message to log.')
-                    self.slack_logs.add_to_logs(message, channel_name)
+        self.logger.info('Indexing channel and user names.')
+        self.name_index.build(self.slack_client.server)
 
-                    self.logger.debug('Regenerating models.')
-                    self.model_controller.regenerate_slack_models(
-                        self.slack_logs,
-                        channel_name,
-                        message['user'])
+        self.logger.info('Setting user info.')
+        self.set_user_info()
 
-            self.autoping()
-            time.sleep(.1)
+    def start_services(self):
+        """Builds the models, unless they survived a reconnect, and starts
+        the training worker and sentence pool.
+        """
+
+        # Models outlive the connection, so reconnecting doesn't retrain.
+        if self.model_controller is None:
+            self.model_controller = self.build_model_controller()
+        else:
+            self.logger.info('Reusing models from previous connection.')
+
+        if self.message_interpreter is None:
+            self.message_interpreter = message_interpreter.MessageInterpreter(
+                self.user_id,
+                self.username,
+                self.commands.keys(),
+                self.external_texts.keys())
+
+        if self.training_worker is None:
+            self.training_worker = training_worker.TrainingWorker(
+                self.model_controller,
+                self.slack_logs,
+                max_queue_size=self.training_queue_size,
+                put_timeout=self.training_queue_timeout,
+                batch_size=self.training_batch_size,
+                batch_interval=self.training_batch_interval,
+                max_staleness=self.training_max_staleness)
+
+        self.training_worker.start()
+        self.message_sender.start()
+
+        if self.sentence_pool is None and self.sentence_pool_size > 0:
+            self.sentence_pool = sentence_pool.SentencePool(
+                self.model_controller,
+                pool_size=self.sentence_pool_size,
+                refill_threshold=self.sentence_pool_refill_threshold,
+                max_pools=self.sentence_pool_models,
+                max_age=self.sentence_pool_max_age)
+            self.model_controller.sentence_pool = self.sentence_pool
+
+        if self.sentence_pool is not None:
+            self.sentence_pool.start()
+
+    def handle_message(self, message):
+        """Responds to a message or learns it.
+
+        :param message: a message read from Slack.
+        """
+
+        self.logger.debug('Retrieved message: {0}'.format(message))
+
+        self.name_index.update(message)
+
+        if (self.message_interpreter.is_respondable(message)):
+            self.logger.debug('Message was respondable, responding.')
+            self.respond(message)
+
+        elif (self.model_controller.is_learnable(message)):
+            self.logger.debug('Message was learnable.')
+            self.learn_message(message)
+
+    def learn_message(self, message):
+        """Queues a learnable message for training.
+
+        :param message: a learnable message.
+        """
+
+        channel_name = self.get_channel_name(message.get('channel'))
+
+        self.logger.debug('Queueing message for training.')
+        self.training_worker.submit(message, channel_name)
 
     def set_user_info(self):
         """Sets the bot's user info so that it can reply to mentions.
@@ -153,8 +345,7 @@ class MarkovSlackbot(object):
         self.username = self.slack_client.server.username
         self.logger.info('Set username: {0}'.format(self.username))
 
-        user = self.slack_client.server.users.find(self.username)
-        self.user_id = user.id
+        self.user_id = self.name_index.user_id(self.username)
         self.logger.info('Set user_id: {0}'.format(self.user_id))
 
     def respond(self, message):
@@ -164,35 +355,26 @@ class MarkovSlackbot(object):
             message_text = message['text']
             channel = message['channel']
 
-            commands = self.message_interpreter.find_commands(message_text)
+            parsed_message = self.message_interpreter.parse(message_text)
 
-            if commands:
-                for command_name in commands:
+            if parsed_message.commands:
+                for command_name in parsed_message.commands:
                     command_name = self.commands[command_name]
                     command_name(channel)
             elif channel not in self.silent_channels:
-                masters = self.message_interpreter.find_master(message_text)
-
-                channels = self.message_interpreter.find_channels(message_text)
-
                 self.logger.debug('Finding channel names.')
 
                 channel_names = [self.get_channel_name(channel)
-                                 for channel in channels]
+                                 for channel in parsed_message.channels]
 
                 self.logger.debug(
                     'Found channel names: {0}'.format(channel_names))
 
-                users = self.message_interpreter.find_users(message_text)
-
-                external_texts = self.message_interpreter.find_external_texts(
-                    message_text)
-
                 response = self.model_controller.build_message(
-                    masters,
+                    parsed_message.masters,
                     channel_names,
-                    users,
-                    external_texts)
+                    parsed_message.users,
+                    parsed_message.external_texts)
 
                 self.send_message(channel, response)
 
@@ -212,8 +394,52 @@ class MarkovSlackbot(object):
             self.slack_client.server.ping()
             self.last_ping = now
 
+    def metrics(self):
+        """Gets the metrics of the training worker, the model caches, the
+        sentence pool and the message sender.
+
+        :returns metrics: a dict of dicts of metrics by component.
+        """
+
+        metrics = {'sender': self.message_sender.metrics()}
+
+        if self.model_controller is not None:
+            metrics['models'] = self.model_controller.models.metrics()
+
+            # The combined model cache is guarded by the controller's lock.
+            with self.model_controller.lock:
+                metrics['combined_models'] = (
+                    self.model_controller.combined_models.metrics())
+
+        if self.training_worker is not None:
+            metrics['training'] = self.training_worker.metrics()
+
+        if self.sentence_pool is not None:
+            metrics['sentence_pool'] = self.sentence_pool.metrics()
+
+        return metrics
+
+    def report_metrics(self):
+        """Logs the metrics every metrics_interval seconds, unless it is 0.
+        """
+
+        if not self.metrics_interval:
+            return
+
+        now = time.time()
+
+        if now >= self.last_metrics + self.metrics_interval:
+            self.last_metrics = now
+
+            # Reporting is best effort, it must never take the bot down.
+            try:
+                self.logger.info('Metrics: {0}'.format(
+                    json.dumps(self.metrics(), sort_keys=True)))
+            except Exception:
+                self.logger.exception('Failed to report metrics.')
+
     def send_message(self, channel, message):
-        """Send message to channel.
+        """Send message to channel, through the rate limited send queue.
 
         :param channel: A slack channel.
         :param message: The message to send.
@@ -224,7 +450,7 @@ class MarkovSlackbot(object):
         if not self.send_mentions:
             message = self.clean_reply(message)
 
-        self.slack_client.rtm_send_message(channel, message)
+        self.message_sender.send(channel, message)
 
     def clean_reply(self, message):
         """Cleans message of mentions and bangs.
@@ -279,14 +505,12 @@ class MarkovSlackbot(object):
 
         self.logger.debug('Retrieving username for: {0}'.format(user_id))
 
-        user = self.slack_client.server.users.find(user_id)
+        username = self.name_index.username(user_id)
 
-        if user is None:
-            username = None
+        if username is None:
             self.logger.warn(
                 'Could not find username for: {0}'.format(user_id))
         else:
-            username = user.name
             self.logger.debug('Found username: {0}'.format(username))
 
         return username
@@ -301,14 +525,12 @@ class MarkovSlackbot(object):
         self.logger.debug(
             'Retrieving channel name for: {0}'.format(channel_id))
 
-        channel = self.slack_client.server.channels.find(channel_id)
+        channel_name = self.name_index.channel_name(channel_id)
 
-        if channel is None:
-            channel_name = None
+        if channel_name is None:
             self.logger.warn(
-                'Could not find channel name for: {0}'.format(channel_name))
+                'Could not find channel name for: {0}'.format(channel_id))
         else:
-            channel_name = channel.name
             self.logger.debug(
                 'Found channel name for: {0}'.format(channel_name))
 
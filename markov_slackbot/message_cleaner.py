@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+
+# Bump whenever the rules change so that cleaned text stored with an older
+# version is cleaned again.
+CLEANING_VERSION = 1
+
+CLEANING_RULES = (
+    (re.compile('```(?:[^`]+|`(?!``))*```', flags=re.M), ''),
+    (re.compile('(<)[^!@<>]*(>)'), ''),
+)
+
+CLEANED_FIELD = 'cleaned_text'
+
+
+def clean_text(text):
+    """Runs text through every cleaning rule.
+
+    :param text: the text of a message.
+    :returns cleaned_text: the cleaned text.
+    """
+
+    for regex, replacement in CLEANING_RULES:
+        text = regex.sub(replacement, text)
+
+    return text
+
+
+def cleaned_text(message):
+    """Gets the cleaned text of a message, cleaning it unless it was already
+    cleaned at ingest.
+
+    :param message: a message object with text.
+    :returns cleaned_text: the cleaned text.
+    """
+
+    cleaned = message.get(CLEANED_FIELD)
+
+    if cleaned is None:
+        cleaned = clean_text(message['text'])
+
+    return cleaned
@@ -1,87 +1,153 @@
 # -*- coding: utf-8 -*-
 
-from itertools import chain
+from collections import namedtuple
 import logging
 import re
 
 
+ParsedMessage = namedtuple(
+    'ParsedMessage',
+    ['commands', 'masters', 'channels', 'users', 'external_texts'])
+
+MASTER_NAMES = ('master', 'slack')
+
+# Marks the node of the external text trie where a name ends.
+NAME_END = ''
+
+
 class MessageInterpreter(object):
     def __init__(self, user_id, username, command_names, external_texts):
         self.logger = logging.getLogger(__name__)
         self.user_id = user_id
         self.username = username
+        self.command_names = list(command_names)
         self.external_texts = external_texts
-        self.command_regexes = self.compile_command_regexes(command_names)
-        self.master_regex = re.compile('master|slack')
-        self.channel_regex = re.compile('<\#(C[A-Z0-9]{8})>')
-        self.user_regex = re.compile('<\@(U[A-Z0-9]{8})>')
-        self.external_text_regexes = self.compile_external_text_regexes(
+        self.scanner = self.compile_scanner(self.command_names)
+        self.external_text_trie = self.build_external_text_trie(
             external_texts)
 
-    def compile_command_regexes(self, command_names):
-        command_regexes = [re.compile('({0})'.format(command))
-                           for command in command_names]
-        return command_regexes
+    def compile_scanner(self, command_names):
+        """Compiles a regex that finds every channel mention, user mention,
+        master mention, command and external text marker in a single scan.
 
-    def compile_external_text_regexes(self, external_texts):
-        external_text_regexes = [re.compile('\\$({0})'.format(external_text))
-                                 for external_text in external_texts]
-        return external_text_regexes
+        The alternatives sit in a lookahead, so a match never hides another
+        one that starts later, like a command inside a master mention, and
+        only the first alternative is found where two start together.
+        """
 
-    def find_commands(self, message_text):
-        """Finds all commands in message_text.
+        return re.compile(
+            '(?=<#(C[A-Z0-9]{{8}})>|<@(U[A-Z0-9]{{8}})>|({0})|({1})|(\\$))'
+            .format('|'.join(MASTER_NAMES),
+                    '|'.join(re.escape(command) for command in command_names)
+                    or '(?!)'))
+
+    def build_external_text_trie(self, external_texts):
+        """Builds a trie of the external text names, with the position of
+        each name for ordering results.
+        """
+
+        trie = {}
+        self.external_text_order = {}
+
+        for i, external_text in enumerate(external_texts):
+            node = trie
+
+            for character in external_text:
+                node = node.setdefault(character, {})
+
+            node[NAME_END] = external_text
+            self.external_text_order[external_text] = i
+
+        return trie
+
+    def parse(self, message_text):
+        """Finds the commands, master mentions, channel mentions, user
+        mentions and external text mentions in message_text in one pass.
+
+        Commands are listed once each, in the order they were given.
+        External texts are mentioned as ``$name``, ignoring spaces, and are
+        listed in the order they were given, once for every mention.
 
         :param message_text: the message to search.
-        :returns command_list: all commands that were found.
+        :returns parsed_message: a ParsedMessage of what was found.
         """
 
-        self.logger.debug('Finding commands...')
+        found_commands = set()
+        masters = []
+        channels = []
+        users = []
+        external_texts = []
 
-        commands = [self.find_command(command_regex, message_text)
-                    for command_regex in self.command_regexes]
+        for match in self.scanner.finditer(message_text):
+            channel, user, master, command, dollar = match.groups()
 
-        command_list = [command for command in commands if command is not None]
+            if channel:
+                channels.append(channel)
+            elif user:
+                users.append(user)
+            elif master:
+                masters.append(master)
+            elif command:
+                found_commands.add(command)
+            elif dollar:
+                external_texts += self.match_external_texts(
+                    message_text, match.start() + 1)
 
-        self.logger.debug('Found commands: {0}'.format(command_list))
+        commands = [command for command in self.command_names
+                    if command in found_commands]
 
-        return command_list
+        external_texts.sort(key=self.external_text_order.get)
 
-    def find_command(self, command_regex, message_text):
-        """Finds a specific command in message_text.
+        parsed_message = ParsedMessage(
+            commands, masters, channels, users, external_texts)
+
+        self.logger.debug('Parsed message: {0}'.format(parsed_message))
+
+        return parsed_message
+
+    def match_external_texts(self, message_text, start):
+        """Finds every external text name that message_text continues with
+        from start on, skipping spaces.
 
-        :param command_regex: the regex for the command.
         :param message_text: the message to search.
-        :returns command_match: the matching command.
+        :param start: the position just after a ``$``.
+        :returns names: the matching names, shortest first.
         """
 
-        self.logger.debug(
-            'Finding command with regex: {0}'.format(command_regex))
+        names = []
+        node = self.external_text_trie
 
-        command_matches = command_regex.findall(message_text)
+        for character in message_text[start:]:
+            if character == ' ':
+                continue
 
-        if command_matches:
-            command_match = command_matches[0]
-            self.logger.debug('Found command: {0}'.format(command_match))
-        else:
-            command_match = None
-            self.logger.debug('Did not find command.')
+            node = node.get(character)
 
-        return command_match
+            if node is None:
+                break
 
-    def find_master(self, message_text):
-        """Finds all master mentions.
+            if NAME_END in node:
+                names.append(node[NAME_END])
+
+        return names
+
+    def find_commands(self, message_text):
+        """Finds all commands in message_text.
 
         :param message_text: the message to search.
-        :returns masters: a list of master mentions.
+        :returns command_list: all commands that were found.
         """
 
-        self.logger.debug('Finding master mentions.')
+        return self.parse(message_text).commands
 
-        masters = self.master_regex.findall(message_text)
+    def find_master(self, message_text):
+        """Finds all master mentions.
 
-        self.logger.debug('Found master mentions: {0}'.format(masters))
+        :param message_text: the message to search.
+        :returns masters: a list of master mentions.
+        """
 
-        return masters
+        return self.parse(message_text).masters
 
     def find_channels(self, message_text):
         """Finds all channel mentions.
@@ -90,13 +156,7 @@ class MessageInterpreter(object):
         :returns channels: a list of channel mentions.
         """
 
-        self.logger.debug('Finding channel mentions.')
-
-        channels = self.channel_regex.findall(message_text)
-
-        self.logger.debug('Found channel mentions: {0}'.format(channels))
-
-        return channels
+        return self.parse(message_text).channels
 
     def find_users(self, message_text):
         """Finds all user mentions.
@@ -105,13 +165,7 @@ class MessageInterpreter(object):
         :returns users: a list of user mentions.
         """
 
-        self.logger.debug('Finding user mentions.')
-
-        users = self.user_regex.findall(message_text)
-
-        self.logger.debug('Found user mentions: {0}'.format(users))
-
-        return users
+        return self.parse(message_text).users
 
     def find_external_texts(self, message_text):
         """Find all external text mentions.
@@ -120,20 +174,7 @@ class MessageInterpreter(object):
         :returns external_texts: a list of external text mentions.
         """
 
-        self.logger.debug('Finding external text mentions.')
-
-        external_texts = []
-        spaceless_message = message_text.replace(' ', '')
-
-        matches = [regex.findall(spaceless_message)
-                   for regex in self.external_text_regexes]
-
-        external_texts = list(chain.from_iterable(matches))
-
-        self.logger.debug(
-            'Found external text mentions: {0}'.format(external_texts))
-
-        return external_texts
+        return self.parse(message_text).external_texts
 
     def is_respondable(self, message):
         """Determines if the bot should reply to the message
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+import logging
+import threading
+import time
+
+
+class TokenBucket(object):
+    """Allows ``rate`` events a second on average, in bursts of up to
+    ``burst`` events.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def refill(self, now):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Gets how long until an event is allowed.
+
+        :param now: the current time.
+        :returns wait_time: the number of seconds to wait, 0 if allowed now.
+        """
+
+        self.refill(now)
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+
+class MessageSender(object):
+    """Sends messages to Slack from a background thread, within rate limits.
+
+    Messages wait in a queue per channel and are sent oldest first, as long
+    as both the channel's token bucket and the global one allow it. Messages
+    waiting for the same channel are coalesced into one message of up to
+    ``max_message_length`` characters. A failed send is retried with
+    exponential backoff up to ``max_retries`` times before it is dropped.
+    Once ``max_queue_size`` messages are waiting, new ones are dropped.
+    """
+
+    def __init__(self, send_function, rate=1.0, burst=4, channel_rate=1.0,
+                 channel_burst=2, max_retries=5, retry_backoff=1.0,
+                 max_backoff=30.0, max_queue_size=1000,
+                 max_message_length=4000, drain_timeout=5.0):
+        """
+        :param send_function: sends a message given a channel and text.
+        :param rate: the messages a second allowed across every channel.
+        :param burst: the messages allowed at once across every channel.
+        :param channel_rate: the messages a second allowed in a channel.
+        :param channel_burst: the messages allowed at once in a channel.
+        :param max_retries: the times to retry a failed send.
+        :param retry_backoff: the seconds to wait before the first retry,
+            doubled for every retry after it.
+        :param max_backoff: the most seconds to wait before a retry.
+        :param max_queue_size: the most messages to keep waiting.
+        :param max_message_length: the longest message to coalesce into.
+        :param drain_timeout: the seconds stop waits for waiting messages.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.send_function = send_function
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.max_queue_size = max_queue_size
+        self.max_message_length = max_message_length
+        self.drain_timeout = drain_timeout
+
+        self.bucket = TokenBucket(rate, burst)
+        self.channel_buckets = {}
+
+        # Channel to [deque of (time queued, text), time to retry, retries].
+        self.channels = {}
+        self.depth = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stop_at = None
+
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.latencies = deque(maxlen=1000)
+
+    def start(self):
+        """Starts the sender thread.
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stop_at = None
+        self.thread = threading.Thread(target=self.run, name='message-sender')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Sends the waiting messages, for up to drain_timeout seconds, and
+        stops the sender thread.
+        """
+
+        if self.thread is None:
+            return
+
+        with self.condition:
+            self.stop_at = time.time() + self.drain_timeout
+            self.condition.notify()
+
+        self.thread.join()
+        self.thread = None
+
+    def send(self, channel, text):
+        """Queues a message to be sent.
+
+        :param channel: the id of the channel to send it to.
+        :param text: the text of the message.
+        :returns queued: whether the message was queued.
+        """
+
+        with self.condition:
+            if self.depth >= self.max_queue_size:
+                self.dropped += 1
+                self.logger.warning(
+                    'Send queue full, dropped message. Metrics: {0}'.format(
+                        self.metrics()))
+                return False
+
+            queue = self.channels.get(channel)
+
+            if queue is None:
+                queue = self.channels[channel] = [deque(), 0, 0]
+
+            queue[0].append((time.time(), text))
+            self.depth += 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            self.condition.notify()
+
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                channel, wait_time = self.next_channel(time.time())
+
+                while channel is None:
+                    if self.stop_at is not None:
+                        if not self.channels:
+                            return
+
+                        if time.time() >= self.stop_at:
+                            self.logger.warning(
+                                'Stopped with {0} messages unsent.'.format(
+                                    self.depth))
+                            return
+
+                        wait_time = min(wait_time or self.drain_timeout,
+                                        self.stop_at - time.time())
+
+                    self.condition.wait(wait_time)
+                    channel, wait_time = self.next_channel(time.time())
+
+                queued_at, text, count = self.take_message(channel)
+
+            self.deliver(channel, queued_at, text, count)
+
+    def next_channel(self, now):
+        """Finds the channel whose oldest message is next to be sent.
+
+        :param now: the current time.
+        :returns channel, wait_time: the channel if one can be sent to now,
+            else None and the seconds until one can, or None if there are no
+            messages.
+        """
+
+        global_wait = self.bucket.wait_time(now)
+        next_channel = None
+        oldest = None
+        wait_time = None
+
+        for channel, (messages, retry_at, retries) in self.channels.items():
+            if not messages:
+                continue
+
+            bucket = self.channel_buckets.get(channel)
+            channel_wait = bucket.wait_time(now) if bucket else 0
+            ready_in = max(global_wait, channel_wait, retry_at - now)
+
+            if ready_in > 0:
+                if wait_time is None or ready_in < wait_time:
+                    wait_time = ready_in
+            elif oldest is None or messages[0][0] < oldest:
+                next_channel = channel
+                oldest = messages[0][0]
+
+        if next_channel is not None:
+            return next_channel, 0
+
+        return None, wait_time
+
+    def take_message(self, channel):
+        """Takes the oldest messages of a channel, coalesced into one, and
+        uses up a token of each bucket.
+
+        :param channel: the channel to send to.
+        :returns queued_at, text, count: when the oldest message was queued,
+            the coalesced text and the number of messages in it.
+        """
+
+        now = time.time()
+        messages = self.channels[channel][0]
+        queued_at, text = messages.popleft()
+        count = 1
+
+        while (messages and len(text) + 1 + len(messages[0][1]) <=
+               self.max_message_length):
+            text += '\n' + messages.popleft()[1]
+            count += 1
+
+        self.depth -= count
+        self.coalesced += count - 1
+
+        bucket = self.channel_buckets.get(channel)
+
+        if bucket is None:
+            bucket = self.channel_buckets[channel] = TokenBucket(
+                self.channel_rate, self.channel_burst)
+
+        bucket.take(now)
+        self.bucket.take(now)
+
+        return queued_at, text, count
+
+    def deliver(self, channel, queued_at, text, count):
+        """Sends a message, putting it back to be retried if it fails.
+
+        :param channel: the channel to send to.
+        :param queued_at: when the oldest message in it was queued.
+        :param text: the text of the message.
+        :param count: the number of messages coalesced into it.
+        """
+
+        try:
+            self.send_function(channel, text)
+        except Exception:
+            self.logger.exception('Failed to send message.')
+            self.retry(channel, queued_at, text, count)
+            return
+
+        with self.condition:
+            queue = self.channels[channel]
+            queue[2] = 0
+
+            if not queue[0]:
+                del self.channels[channel]
+
+            self.sent += count
+            self.latencies.append(time.time() - queued_at)
+
+    def retry(self, channel, queued_at, text, count):
+        with self.condition:
+            queue = self.channels[channel]
+            queue[2] += 1
+
+            if queue[2] > self.max_retries:
+                self.failed += count
+                queue[1] = 0
+                queue[2] = 0
+
+                if not queue[0]:
+                    del self.channels[channel]
+
+                return
+
+            self.retries += 1
+            queue[0].appendleft((queued_at, text))
+            queue[1] = time.time() + min(
+                self.retry_backoff * 2 ** (queue[2] - 1), self.max_backoff)
+            self.depth += 1
+
+    def metrics(self):
+        """Gets the queue depth and send latency of the sender.
+
+        :returns metrics: a dict of metrics.
+        """
+
+        with self.condition:
+            latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+
+            return latencies[min(int(len(latencies) * fraction),
+                                 len(latencies) - 1)]
+
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+            'latency_max': latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import logging
+import threading
+
+from markov_slackbot.composite_text import CompositeText
+
+
+# Rough CPython costs of a model reference and of one cached begin state
+# transition, used to keep the cache within budget.
+BYTES_PER_MODEL = 400
+BYTES_PER_TRANSITION = 100
+
+
+def estimate_model_size(model):
+    """Estimates the memory used by a combined model, which is mostly its
+    cached begin state.
+
+    :param model: the CompositeText to measure.
+    :returns size: the estimated size in bytes.
+    """
+
+    begin_state = model.chain.begin_state
+    transitions = sum(len(chain.model.get(begin_state, {}))
+                      for chain in model.chain.chains)
+
+    return (len(model.models) * BYTES_PER_MODEL +
+            transitions * BYTES_PER_TRANSITION)
+
+
+class CombinedModelCache(object):
+    """A least recently used cache of combined models.
+
+    Entries are keyed by the identities and versions of the models they were
+    combined from, and hold on to those models so that their identities can't
+    be reused while cached.
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: the memory budget of the cache in bytes.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, models, weights):
+        return tuple(sorted((id(model), model.version, weight)
+                            for model, weight in zip(models, weights)))
+
+    def combine(self, models, weights=None):
+        """Combines models, reusing a cached combination if there is one.
+
+        :param models: the models to combine.
+        :param weights: a weight for each model, 1 for each by default.
+        :returns combined_model: the combined model.
+        """
+
+        if weights is None:
+            weights = [1] * len(models)
+
+        if len(models) == 1:
+            return models[0]
+
+        key = self.make_key(models, weights)
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+
+        combined_model = CompositeText(list(models), list(weights))
+        size = estimate_model_size(combined_model)
+
+        if size <= self.max_size:
+            self.entries[key] = (list(models), combined_model, size)
+            self.size += size
+            self.evict()
+
+        return combined_model
+
+    def invalidate(self, model):
+        """Drops every cached combination that model is part of.
+
+        :param model: a model that changed.
+        """
+
+        for key, entry in list(self.entries.items()):
+            if any(cached is model for cached in entry[0]):
+                self.remove(key)
+
+    def evict(self):
+        while self.size > self.max_size:
+            key = next(iter(self.entries))
+            self.logger.debug('Evicting combined model: {0}'.format(key))
+            self.remove(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry[2]
+
+    def metrics(self):
+        """Gets the hit rate and size of the cache.
+
+        :returns metrics: a dict of metrics.
+        """
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'size': self.size,
+            'max_size': self.max_size,
+        }
+
+
+# Rough CPython cost of one chain state with its follows.
+BYTES_PER_STATE = 300
+
+
+def estimate_text_size(model):
+    """Estimates the memory used by a trained model.
+
+    :param model: the IncrementalText to measure.
+    :returns size: the estimated size in bytes.
+    """
+
+    return (model.chain.state_count() * BYTES_PER_STATE +
+            model.text_size())
+
+
+class ModelCache(object):
+    """A least recently used cache of trained models, keyed by (kind, name),
+    that keeps their estimated size within a memory budget.
+
+    The cache knows every model that exists, in memory or not. Models evicted
+    to stay within budget are handed to on_evict and loaded again with
+    load_model the next time they are asked for.
+
+    Models are loaded outside the lock, so that loading one never holds up
+    the users of the others. Every key has a version, bumped whenever its
+    model is put or touched, and a load that finds the version changed once
+    it is done starts over, as it may have loaded an outdated model.
+    """
+
+    def __init__(self, load_model, max_size=0, on_evict=None, lock=None):
+        """
+        :param load_model: loads an evicted model given its kind and name,
+            returning None if it no longer exists.
+        :param max_size: the memory budget of the cache in bytes, or 0 to
+            never evict.
+        :param on_evict: called with the key and model of every eviction.
+        :param lock: the lock guarding the cache and what load_model reads.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.load_model = load_model
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.lock = lock if lock is not None else threading.RLock()
+        self.size = 0
+        self.entries = OrderedDict()
+        self.names = {}
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def view(self, kind):
+        """Gets a dict-like view of the models of one kind.
+
+        :param kind: the kind of the models.
+        :returns view: a ModelCacheView.
+        """
+
+        return ModelCacheView(self, kind)
+
+    def has(self, key):
+        """Whether a model exists, without loading it.
+        """
+
+        kind, name = key
+
+        return name in self.names.get(kind, ())
+
+    def register(self, key):
+        """Records that a model exists without loading it, so that it is
+        loaded when it is first asked for.
+        """
+
+        with self.lock:
+            self.names.setdefault(key[0], set()).add(key[1])
+
+    def peek(self, key):
+        """Gets a model only if it is in memory.
+
+        :returns model: the model, or None.
+        """
+
+        entry = self.entries.get(key)
+
+        return entry[0] if entry is not None else None
+
+    def load(self, key):
+        """Gets a model, loading it again if it was evicted.
+
+        :param key: the (kind, name) of the model.
+        :returns model: the model, or None if there is no such model.
+        """
+
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+
+                if entry is not None:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return entry[0]
+
+                if not self.has(key):
+                    return None
+
+                version = self.versions.get(key, 0)
+
+            self.logger.debug('Loading evicted model: {0}'.format(key))
+            model = self.load_model(*key)
+
+            with self.lock:
+                if (key not in self.entries and
+                        self.versions.get(key, 0) == version):
+                    self.misses += 1
+                    self.put(key, model)
+                    return model
+
+    def touch(self, key):
+        """Marks that what load_model loads for a key changed, so that loads
+        of it already under way start over.
+        """
+
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def put(self, key, model):
+        """Adds or replaces a model, evicting the least recently used models
+        if that goes over budget.
+
+        :param key: the (kind, name) of the model.
+        :param model: the model, or None if there is no longer a model.
+        """
+
+        with self.lock:
+            self.remove(key)
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+            if model is None:
+                self.names.get(key[0], set()).discard(key[1])
+                return
+
+            size = estimate_text_size(model)
+            self.entries[key] = (model, size)
+            self.size += size
+            self.names.setdefault(key[0], set()).add(key[1])
+            self.evict()
+
+    def resize(self, key):
+        """Measures a model again after it learned more text.
+
+        :param key: the (kind, name) of the model.
+        """
+
+        with self.lock:
+            model = self.peek(key)
+
+            if model is not None:
+                self.put(key, model)
+
+    def evict(self):
+        # The most recently used model always stays, even over budget.
+        while (self.max_size and self.size > self.max_size and
+               len(self.entries) > 1):
+            key = next(iter(self.entries))
+            model = self.remove(key)
+            self.evictions += 1
+            self.logger.debug('Evicting model: {0}'.format(key))
+
+            if self.on_evict is not None:
+                self.on_evict(key, model)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+
+        if entry is None:
+            return None
+
+        self.size -= entry[1]
+
+        return entry[0]
+
+    def metrics(self):
+        """Gets the hit rate, evictions and size of the cache.
+
+        :returns metrics: a dict of metrics.
+        """
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'models': sum(len(names) for names in self.names.values()),
+                'resident': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+            }
+
+
+class ModelCacheView(Mapping):
+    """A dict of the models of one kind in a ModelCache, by name.
+
+    Looking a model up loads it if it was evicted, while ``in`` and
+    iterating only look at the names of the models.
+    """
+
+    def __init__(self, cache, kind):
+        self.cache = cache
+        self.kind = kind
+
+    def __getitem__(self, name):
+        model = self.cache.load((self.kind, name))
+
+        if model is None:
+            raise KeyError(name)
+
+        return model
+
+    def __contains__(self, name):
+        return self.cache.has((self.kind, name))
+
+    def __iter__(self):
+        return iter(list(self.cache.names.get(self.kind, ())))
+
+    def __len__(self):
+        return len(self.cache.names.get(self.kind, ()))
+
+    def __setitem__(self, name, model):
+        self.cache.put((self.kind, name), model)
+
+    def peek(self, name):
+        return self.cache.peek((self.kind, name))
+
+    def resize(self, name):
+        self.cache.resize((self.kind, name))
@@ -1,84 +1,382 @@
 # -*- coding: utf-8 -*-
 
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import logging
 import re
+import threading
 
-import markovify
+from markov_slackbot.compact_chain import CompactText
+from markov_slackbot.incremental_text import AggregateText, IncrementalText
+from markov_slackbot.message_cleaner import cleaned_text
+from markov_slackbot.model_cache import CombinedModelCache, ModelCache
+from markov_slackbot.sentence_pool import MASTER_KEY
+
+
+TEXT_CLASSES = {
+    'dict': IncrementalText,
+    'compact': CompactText,
+}
+
+
+def train_serialized(chain_backend, training_text):
+    """Trains a model in a worker process.
+
+    :param chain_backend: the name of the text class to train.
+    :param training_text: the text to train on.
+    :returns model_dict: the model dumped by to_dict, or None if it is empty.
+    """
+
+    model = TEXT_CLASSES[chain_backend](training_text)
+
+    if model.is_empty():
+        return None
+
+    return model.to_dict()
+
+
+def message_key(message):
+    """Identifies a logged message the same way in every log backend.
+
+    :param message: a message object.
+    :returns key: a hashable key.
+    """
+
+    return (message.get('user'), message.get('ts'), message.get('text'))
 
 
 class ModelController(object):
     """
     """
 
-    def __init__(self, user_id, username, slack_logs, external_texts):
+    def __init__(self, user_id, username, slack_logs, external_texts,
+                 snapshot=None, combined_model_cache_size=64 * 1024 * 1024,
+                 chain_backend='dict', training_processes=1,
+                 model_cache_size=0):
         self.logger = logging.getLogger(__name__)
         self.logger.info('Initializing model controller.')
 
         self.user_id = user_id
         self.username = username
-
-        self.replacement_functions = self.build_replacement_functions()
-
-        self.master_model = self.generate_slack_model(slack_logs.master_log)
+        self.slack_logs = slack_logs
+        self.external_texts = external_texts
+        self.snapshot = snapshot
+        self.updated_models = set()
+        self.unlearned = Counter()
+        self.combined_models = CombinedModelCache(combined_model_cache_size)
+        self.lock = threading.RLock()
+        self.chain_backend = chain_backend
+        self.text_class = TEXT_CLASSES[chain_backend]
+        self.training_processes = training_processes
+        self.sentence_pool = None
+
+        self.models = ModelCache(self.load_model, model_cache_size,
+                                 on_evict=self.evict_model, lock=self.lock)
+        self.channel_models = self.models.view('channels')
+        self.user_models = self.models.view('users')
+        self.external_models = self.models.view('external_texts')
+        self.master_model = AggregateText(
+            [], chain_class=self.text_class.chain_class)
+        self.master_model.load_models = self.iter_channel_models
+
+        if snapshot is not None:
+            self.load_snapshot(slack_logs, external_texts)
+            return
 
         self.logger.info(
             'Generating {0} channel models'.format(
                 len(slack_logs.channel_logs)))
 
-        self.channel_models = self.generate_slack_models(
-            slack_logs.channel_logs)
+        self.add_slack_models(
+            'channels', self.generate_slack_models(slack_logs.channel_logs))
 
         self.logger.info(
             'Generating {0} user models'.format(len(slack_logs.user_logs)))
 
-        self.user_models = self.generate_slack_models(slack_logs.user_logs)
+        self.add_slack_models(
+            'users', self.generate_slack_models(slack_logs.user_logs))
+
+        self.add_external_models(external_texts)
+
+    def load_snapshot(self, slack_logs, external_texts):
+        """Loads models from the snapshot, retraining only the ones whose
+        sources changed, and saves the retrained ones back.
+
+        :param slack_logs: the slack logs to train from.
+        :param external_texts: a dict of external texts with their names.
+        """
+
+        stale = self.snapshot.find_stale_models(
+            self.user_id, self.username, slack_logs)
+
+        self.updated_models = set(
+            (kind, name) for kind, names in stale.items() for name in names)
+
+        self.logger.info(
+            'Generating {0} channel models'.format(len(stale['channels'])))
+
+        self.add_slack_models('channels', self.load_slack_models(
+            'channels', slack_logs.channel_logs, stale['channels']))
 
         self.logger.info(
-            'Generating {0} external models'.format(len(external_texts)))
+            'Generating {0} user models'.format(len(stale['users'])))
+
+        self.add_slack_models('users', self.load_slack_models(
+            'users', slack_logs.user_logs, stale['users']))
+
+        self.add_external_models(external_texts)
+
+        self.save_snapshot(slack_logs)
+
+    def load_slack_models(self, kind, logs, stale_names):
+        """Loads slack models from the snapshot, training stale ones.
 
-        self.external_models = self.generate_external_models(external_texts)
+        :param kind: the kind of the models.
+        :param logs: a dict of logs with their names.
+        :param stale_names: the names of the models to train.
+        :returns models: an iterator of (name, model or None) pairs.
+        """
+
+        for name, model in self.generate_slack_models(
+                {name: log for name, log in logs.items()
+                 if name in stale_names}):
+            yield name, model
 
-    def build_replacement_functions(self):
-        """Compile regexes and create sub functions with them.
+        for name in logs:
+            if name not in stale_names:
+                yield name, self.snapshot.load_model(
+                    kind, name, self.text_class)
 
-        :returns replacement_functions: a list of replacement functions.
+    def add_slack_models(self, kind, models):
+        """Adds models to the model cache as they are trained, summing
+        channel models into the master model before they can be evicted.
+
+        :param kind: the kind of the models.
+        :param models: an iterable of (name, model or None) pairs.
         """
 
-        self.logger.debug('Compiling regexes.')
+        for name, model in models:
+            if model is None:
+                continue
 
-        regex_replacement_pairs = (
-            (re.compile('```(?:[^`]+|`(?!``))*```', flags=re.M), ''),
-            (re.compile('(<)[^!@<>]*(>)'), ''))
+            if kind == 'channels':
+                self.master_model.add_model(model)
 
-        self.logger.debug('Building regex sub functions.')
+            self.models.put((kind, name), model)
 
-        replacement_functions = [lambda m: regex.sub(replacement, m)
-                                 for regex, replacement
-                                 in regex_replacement_pairs]
+    def add_external_models(self, external_texts):
+        """Adds the names of the external models to the model cache, leaving
+        them to be loaded or trained when they are first asked for.
 
-        return replacement_functions
+        :param external_texts: a dict of external texts with their names.
+        """
+
+        self.logger.info(
+            'Found {0} external texts'.format(len(external_texts)))
+
+        for name in external_texts:
+            self.models.register(('external_texts', name))
+
+    def load_model(self, kind, name, excluded=None):
+        """Loads a model from the snapshot, or retrains it from its source if
+        it was updated since the snapshot was saved.
+
+        :param kind: the kind of the model.
+        :param name: the name of the model.
+        :param excluded: the keys of logged messages to leave out, the ones
+            logged but not learned yet by default.
+        :returns model: the model, or None if it learned nothing.
+        """
+
+        if self.snapshot is not None and (kind, name) not in \
+                self.updated_models:
+            model = self.snapshot.load_model(kind, name, self.text_class)
+
+            if model is not None:
+                return model
+
+        if kind == 'external_texts':
+            return self.generate_external_model(name)
+
+        if kind == 'channels':
+            log = self.slack_logs.channel_logs.get(name)
+        else:
+            log = self.slack_logs.user_logs.get(name)
+
+        if log is None:
+            return None
+
+        return self.generate_slack_model(self.learned_log(
+            log, self.unlearned if excluded is None else excluded))
+
+    def learned_log(self, log, excluded):
+        """Leaves the excluded messages out of a log.
+
+        :param log: the log.
+        :param excluded: the keys of the messages to leave out.
+        :returns log: the log, or a list of its other messages.
+        """
+
+        if not excluded:
+            return log
+
+        return [message for message in log
+                if message_key(message) not in excluded]
+
+    def log_message(self, slack_logs, message, channel_name):
+        """Logs a message that is yet to be learned. Until update_slack_models
+        learns it, models retrained from the logs leave it out, so that they
+        never learn it twice.
+
+        :param slack_logs: the slack logs to add the message to.
+        :param message: the message.
+        :param channel_name: the name of the channel it was sent to.
+        :returns logged_message: the message as kept in the logs.
+        """
+
+        if channel_name is None:
+            return slack_logs.add_to_logs(message, channel_name)
+
+        key = message_key(message)
+
+        # Marked before it is logged, so no retrain can see it unmarked.
+        with self.lock:
+            self.unlearned[key] += 1
+
+        try:
+            return slack_logs.add_to_logs(message, channel_name)
+        except Exception:
+            self.forget_unlearned([key])
+            raise
+
+    def forget_unlearned(self, keys):
+        with self.lock:
+            for key in keys:
+                if self.unlearned[key] > 1:
+                    self.unlearned[key] -= 1
+                else:
+                    del self.unlearned[key]
+
+    def iter_channel_models(self):
+        """Yields every channel model, loading evicted ones one at a time
+        without caching them, so that going through them stays within the
+        memory budget.
+        """
+
+        for name in self.channel_models:
+            model = self.channel_models.peek(name)
+
+            if model is None:
+                model = self.load_model('channels', name)
+
+            if model is not None:
+                yield model
+
+    def reindex_master_model(self):
+        """Rebuilds the NgramIndex of the master model once it is full.
+
+        This loads every channel model, so it runs outside the lock, on the
+        training worker, the only thread teaching the models. It holds up
+        learning for a while, but never a reply.
+        """
+
+        with self.lock:
+            if not self.master_model.needs_reindex():
+                return
+
+        self.logger.info('Rebuilding the master n-gram index.')
+        self.master_model.reindex()
+
+    def evict_model(self, key, model):
+        """Lets go of every reference to a model evicted from the model
+        cache.
+
+        :param key: the (kind, name) of the model.
+        :param model: the evicted model.
+        """
+
+        if key[0] == 'channels':
+            self.master_model.detach_model(model)
+
+        self.combined_models.invalidate(model)
+
+        if self.sentence_pool is not None:
+            self.sentence_pool.invalidate(key)
+
+    def save_snapshot(self, slack_logs, train_external=False):
+        """Saves models updated since the last save to the snapshot.
+
+        :param slack_logs: the slack logs the models were trained from.
+        :param train_external: whether to train external models that changed
+            since the snapshot was saved, rather than leaving them stale
+            until they are first asked for.
+        """
+
+        if self.snapshot is None:
+            return
+
+        models = {
+            'channels': self.snapshot_models(
+                'channels', slack_logs.channel_logs),
+            'users': self.snapshot_models('users', slack_logs.user_logs),
+            'external_texts': self.snapshot_models(
+                'external_texts', self.external_texts,
+                load_updated=train_external),
+        }
+
+        saved_models = set((kind, name) for kind, name in self.updated_models
+                           if name in models[kind])
+
+        self.snapshot.save(
+            self.user_id,
+            self.username,
+            models,
+            saved_models,
+            slack_logs)
+
+        self.updated_models -= saved_models
+
+    def snapshot_models(self, kind, sources, load_updated=True):
+        """Gets the models of a kind to save. Evicted models that are already
+        saved are given as True.
+
+        :param kind: the kind of the models.
+        :param sources: a dict of the sources of the models with their names.
+        :param load_updated: whether to load updated models that aren't in
+            memory, or to leave them out so they stay stale in the snapshot.
+        :returns models: a dict of models, True or None with their names.
+        """
+
+        models = {}
+
+        for name in sources:
+            key = (kind, name)
+
+            if key in self.updated_models:
+                if load_updated:
+                    models[name] = self.models.load(key)
+                elif self.models.peek(key) is not None:
+                    models[name] = self.models.peek(key)
+            else:
+                models[name] = self.models.peek(key) or (
+                    self.models.has(key) or None)
+
+        return models
 
     def generate_slack_models(self, logs):
         """Generate slack Markovify models.
 
         :param logs: a dict of logs with their names.
-        :returns models: a dict of models with their names.
+        :returns models: an iterator of (name, model or None) pairs.
         """
 
         self.logger.debug(
             'Generating slack models for logs with length: {0}'.format(
                 len(logs)))
 
-        potential_models = {key: self.generate_slack_model(log)
-                            for key, log in logs.items()}
-
-        models = {key: model
-                  for key, model in potential_models.items()
-                  if model is not None}
-
-        self.logger.debug('Generated slack models: {0}'.format(models))
-
-        return models
+        return self.train_models(
+            (key, self.build_training_text(log))
+            for key, log in logs.items())
 
     def generate_slack_model(self, log):
         """Generates a markovify text model from log.
@@ -90,8 +388,25 @@ class ModelController(object):
         self.logger.debug(
             'Generating slack model for log with length: {0}'.format(len(log)))
 
-        cleaned_messages = [self.parse_message(message)
-                            for message in log]
+        model = self.train_model(self.build_training_text(log))
+
+        if model:
+            self.logger.debug('Generated slack model: {0}'.format(model))
+        else:
+            self.logger.debug('Did not generate slack model.')
+
+        return model
+
+    def build_training_text(self, log):
+        """Cleans the messages of a log and joins them into training text.
+
+        :param log: the log to use for training.
+        :returns training_text: the text to train on, or None if there is
+            nothing to learn.
+        """
+
+        cleaned_messages = (self.parse_message(message)
+                            for message in log)
 
         non_empty_cleaned_messages = [message
                                       for message in cleaned_messages
@@ -105,22 +420,115 @@ class ModelController(object):
             else:
                 punctuated_messages += [message]
 
-        if non_empty_cleaned_messages:
-            training_text = '.\n'.join(non_empty_cleaned_messages)
+        if not non_empty_cleaned_messages:
+            return None
 
-            try:
-                model = markovify.Text(training_text)
-                self.logger.debug('Generated slack model: {0}'.format(model))
-            except Exception:
-                model = None
-        else:
-            model = None
+        return '.\n'.join(non_empty_cleaned_messages)
 
-        if not model:
-            self.logger.debug('Did not generate slack model.')
+    def train_model(self, training_text):
+        """Trains a model on text.
+
+        :param training_text: the text to train on, or None.
+        :returns model: the model, or None if it learned nothing.
+        """
+
+        if training_text is None:
+            return None
+
+        model = self.text_class(training_text)
+
+        if model.is_empty():
+            return None
 
         return model
 
+    def train_models(self, training_texts):
+        """Trains a model on each text, across a pool of processes when more
+        than one is configured.
+
+        The models are trained independently, so each worker process trains
+        its share and sends back the to_dict form of every model it trained.
+
+        Trained in a single process, each text is only built when its model
+        is trained, so a text can be dropped as soon as its model exists.
+
+        :param training_texts: an iterable of (name, text or None) pairs.
+        :returns models: an iterator of (name, model or None) pairs, in the
+            order the models are trained.
+        """
+
+        if self.training_processes <= 1:
+            for name, training_text in training_texts:
+                yield name, self.train_model(training_text)
+            return
+
+        names = []
+        texts = []
+
+        for name, training_text in training_texts:
+            if training_text is None:
+                yield name, None
+            else:
+                names.append(name)
+                texts.append(training_text)
+
+        self.logger.info('Training {0} models across {1} processes.'.format(
+            len(names), self.training_processes))
+
+        with ProcessPoolExecutor(self.training_processes) as executor:
+            model_dicts = executor.map(
+                train_serialized,
+                [self.chain_backend] * len(names),
+                texts,
+                chunksize=max(1, len(names) // (self.training_processes * 4)))
+
+            for name, model_dict in zip(names, model_dicts):
+                if model_dict is None:
+                    yield name, None
+                else:
+                    yield name, self.text_class.from_dict(model_dict)
+
+    def train_stream(self, chunks):
+        """Trains a model on a text read a chunk at a time, keeping none of
+        the text, so that memory is bounded by the size of the chain.
+
+        :param chunks: an iterable of consecutive chunks of the text.
+        :returns model: the model, or None if it learned nothing.
+        """
+
+        model = self.text_class('', retain_original=False)
+
+        for chunk in chunks:
+            model.add_text(chunk)
+
+        if model.is_empty():
+            return None
+
+        return model
+
+    def generate_external_model(self, name):
+        """Trains the model of an external text, streaming texts too large
+        to read whole.
+
+        :param name: the name of the external text.
+        :returns model: the model, or None if there is no such text or it
+            learned nothing.
+        """
+
+        if name not in self.external_texts:
+            return None
+
+        self.logger.info('Generating external model: {0}'.format(name))
+
+        # Only ExternalTexts read from disk can stream.
+        text_chunks = getattr(self.external_texts, 'text_chunks', None)
+        chunks = text_chunks(name) if text_chunks is not None else None
+
+        if chunks is not None:
+            return self.train_stream(chunks)
+
+        return self.train_model(self.external_texts[name])
+
     def parse_message(self, message):
         """Parses and cleans a message.
 
@@ -131,12 +539,7 @@ class ModelController(object):
         if not self.is_learnable(message):
             return None
 
-        cleaned_message = message['text']
-
-        for replacement_function in self.replacement_functions:
-            cleaned_message = replacement_function(cleaned_message)
-
-        return cleaned_message
+        return cleaned_text(message)
 
     def is_learnable(self, message):
         """Determines if a message is learnable.
@@ -169,44 +572,53 @@ class ModelController(object):
 
         return True
 
-    def generate_external_models(self, external_texts):
-        external_models = {name: markovify.Text(text)
-                           for name, text in external_texts.items()}
-        return external_models
-
     def build_message(self, masters, channel_names, users, external_texts):
         self.logger.debug('Building response.')
 
+        keys = []
         models = []
 
         for master in masters:
+            keys += [MASTER_KEY]
             models += [self.master_model]
 
         for channel_name in channel_names:
             channel_model = self.channel_models.get(channel_name)
             if channel_model is not None:
+                keys += [('channels', channel_name)]
                 models += [channel_model]
 
         for user in users:
             user_model = self.user_models.get(user)
             if user_model is not None:
+                keys += [('users', user)]
                 models += [user_model]
 
         for external_text in external_texts:
             external_model = self.external_models.get(external_text)
             if external_model is not None:
+                keys += [('external_texts', external_text)]
                 models += [external_model]
 
+        keys, models, weights = self.weigh_models(keys, models)
+
         if models:
-            self.logger.debug('Using models: {0}'.format(models))
+            self.logger.debug('Using models: {0}'.format(keys))
+        else:
+            self.logger.debug('No models, using master.')
+            keys, models, weights = [MASTER_KEY], [self.master_model], [1]
+
+        message = None
+
+        if self.sentence_pool is not None:
+            message = self.sentence_pool.take(keys, models, weights)
+
+        if message is None:
             for i in range(20):
-                message = markovify.combine(models[:5]).make_sentence()
+                message = self.generate_sentence(models, weights)
                 self.logger.debug('Tried to build message...')
                 if message:
                     break
-        else:
-            self.logger.debug('No models, using master.')
-            message = self.master_model.make_sentence()
 
         self.logger.debug(
             'Built response: {0}'.format(message))
@@ -218,9 +630,211 @@ class ModelController(object):
 
         return message
 
-    def regenerate_slack_models(self, slack_logs, channel_name, user):
-        self.master_model = self.generate_slack_model(slack_logs.master_log)
-        self.channel_models[channel_name] = self.generate_slack_model(
-            slack_logs.channel_logs[channel_name])
-        self.user_models[user] = self.generate_slack_model(
-            slack_logs.user_logs[user])
+    def can_generate(self, models):
+        """Whether any of the models learned something to generate from.
+
+        :param models: the models to combine.
+        :returns can_generate: False if every model is empty.
+        """
+
+        with self.lock:
+            return not all(model.is_empty() for model in models)
+
+    def generate_sentence(self, models, weights):
+        """Makes a sentence from a weighted combination of models.
+
+        :param models: the distinct models to combine.
+        :param weights: a weight for each model.
+        :returns sentence: a sentence, or None if none passed the tests.
+        """
+
+        # Learning can't change the models halfway through a sentence.
+        with self.lock:
+            combined_model = self.combined_models.combine(models, weights)
+            return combined_model.make_sentence()
+
+    def weigh_models(self, keys, models):
+        """Merges repeated models into one model with a larger weight.
+
+        :param keys: the (kind, name) of each model, possibly with repeats.
+        :param models: the model of each key.
+        :returns keys, models, weights: the distinct keys, their models and
+            their weights.
+        """
+
+        distinct_keys = []
+        distinct_models = []
+        weights = []
+
+        for key, model in zip(keys, models):
+            if key in distinct_keys:
+                weights[distinct_keys.index(key)] += 1
+            else:
+                distinct_keys.append(key)
+                distinct_models.append(model)
+                weights.append(1)
+
+        return distinct_keys, distinct_models, weights
+
+    def update_slack_models(self, slack_logs, channel_name, messages):
+        """Teaches newly logged messages from a channel to the master, channel
+        and user models without retraining them.
+
+        The messages of each model are joined and learned in one go, which
+        trains the same chain as learning them one at a time. Models that
+        don't exist yet are trained from their logs. An evicted channel model
+        is loaded to learn the messages, as the master model follows it,
+        while evicted user models are left to be retrained from their logs
+        when they are next needed.
+
+        Models are only learned into while holding the lock. They are trained
+        and loaded outside it and swapped in once ready, so that generating
+        never waits on a retrain.
+
+        :param slack_logs: the slack logs the messages were added to.
+        :param channel_name: the name of the channel the messages were sent
+            to.
+        :param messages: the messages to learn, in the order they were sent,
+            which must be the last ones logged to the channel.
+        """
+
+        if channel_name is None:
+            return
+
+        keys = [message_key(message) for message in messages]
+        channel_messages = []
+        user_messages = {}
+
+        for message in messages:
+            cleaned_message = self.parse_message(message)
+
+            if cleaned_message is None:
+                continue
+
+            channel_messages.append(cleaned_message)
+            user_messages.setdefault(message['user'], []).append(
+                cleaned_message)
+
+        if not channel_messages:
+            self.forget_unlearned(key for key in keys if key in self.unlearned)
+            return
+
+        # Marked first, so that models reloaded from here on are retrained
+        # from the logs rather than loaded from the snapshot.
+        with self.lock:
+            self.updated_models.add(('channels', channel_name))
+            self.updated_models.update(
+                ('users', user) for user in user_messages)
+
+        try:
+            self.update_channel_model(
+                slack_logs, channel_name, channel_messages, set(keys))
+
+            for user, cleaned_messages in user_messages.items():
+                self.update_user_model(
+                    slack_logs, user, cleaned_messages, set(keys))
+        finally:
+            with self.lock:
+                self.forget_unlearned(
+                    key for key in keys if key in self.unlearned)
+
+                # Loads started before the messages were learned left them
+                # out, so they have to start over.
+                self.models.touch(('channels', channel_name))
+
+                for user in user_messages:
+                    self.models.touch(('users', user))
+
+    def update_channel_model(self, slack_logs, channel_name, cleaned_messages,
+                             keys):
+        """Teaches cleaned messages to a channel model and the master model.
+
+        :param slack_logs: the slack logs the messages were added to.
+        :param channel_name: the name of the channel.
+        :param cleaned_messages: the cleaned text of the messages.
+        :param keys: the keys of the logged messages being learned.
+        """
+
+        while True:
+            with self.lock:
+                channel_model = self.channel_models.peek(channel_name)
+
+                if channel_model is not None:
+                    self.master_model.apply(*self.update_slack_model(
+                        channel_model, cleaned_messages))
+                    self.channel_models.resize(channel_name)
+                    return
+
+                evicted = channel_name in self.channel_models
+                unlearned = set(self.unlearned)
+
+            changes = None
+
+            # The master model still sums the evicted model, so it has to
+            # learn the messages the same way the reloaded model does.
+            if evicted:
+                channel_model = self.load_model(
+                    'channels', channel_name, excluded=unlearned | keys)
+
+            if channel_model is not None:
+                changes = channel_model.add_text(
+                    '.\n'.join(cleaned_messages), separator='.\n')
+            else:
+                channel_model = self.generate_slack_model(self.learned_log(
+                    slack_logs.channel_logs[channel_name], unlearned - keys))
+
+            with self.lock:
+                # Loaded for a reply in the meantime, so learn into that one.
+                if self.channel_models.peek(channel_name) is not None:
+                    continue
+
+                if changes is not None:
+                    self.master_model.apply(*changes)
+                else:
+                    self.master_model.replace_model(None, channel_model)
+
+                self.channel_models[channel_name] = channel_model
+                return
+
+    def update_user_model(self, slack_logs, user, cleaned_messages, keys):
+        """Teaches cleaned messages to a user model, training it if it is
+        new.
+
+        :param slack_logs: the slack logs the messages were added to.
+        :param user: the id of the user.
+        :param cleaned_messages: the cleaned text of the messages.
+        :param keys: the keys of the logged messages being learned.
+        """
+
+        with self.lock:
+            user_model = self.user_models.peek(user)
+
+            if user_model is not None:
+                self.update_slack_model(user_model, cleaned_messages)
+                self.user_models.resize(user)
+                return
+
+            if user in self.user_models:
+                return
+
+            unlearned = set(self.unlearned)
+
+        user_model = self.generate_slack_model(self.learned_log(
+            slack_logs.user_logs[user], unlearned - keys))
+
+        with self.lock:
+            self.user_models[user] = user_model
+
+    def update_slack_model(self, model, cleaned_messages):
+        """Adds cleaned messages to a model.
+
+        :param model: the model to update.
+        :param cleaned_messages: the cleaned text of the messages to learn.
+        :returns changes: the runs removed from and added to the model.
+        """
+
+        changes = model.add_text('.\n'.join(cleaned_messages),
+                                 separator='.\n')
+        self.combined_models.invalidate(model)
+
+        return changes
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+
+from markov_slackbot.incremental_text import IncrementalText
+from markov_slackbot.message_cleaner import CLEANING_VERSION
+
+
+SNAPSHOT_FORMAT = 2
+
+MODEL_KINDS = ('channels', 'users', 'external_texts')
+
+
+def fingerprint_directory(directory):
+    """Fingerprints every file in a directory by modification time and size.
+
+    :param directory: the directory to fingerprint.
+    :returns fingerprints: a dict of [mtime, size] with filenames as keys.
+    """
+
+    fingerprints = {}
+
+    if not os.path.isdir(directory):
+        return fingerprints
+
+    for filename in os.listdir(directory):
+        stat = os.stat(os.path.join(directory, filename))
+        fingerprints[filename] = [stat.st_mtime_ns, stat.st_size]
+
+    return fingerprints
+
+
+class ModelSnapshot(object):
+    """Trained models saved to disk, with a manifest of the sources they were
+    trained from so that only models with changed sources get retrained.
+
+    Models are saved as ``<snapshot_dir>/<kind>/<name>.json`` next to a
+    ``manifest.json`` holding the source fingerprints.
+    """
+
+    def __init__(self, snapshot_dir, external_texts_dir):
+        self.logger = logging.getLogger(__name__)
+        self.snapshot_dir = snapshot_dir
+        self.external_texts_dir = external_texts_dir
+        self.manifest_path = os.path.join(snapshot_dir, 'manifest.json')
+        self.manifest = self.read_manifest()
+
+    def read_manifest(self):
+        """Reads the manifest of the snapshot, if there is a usable one.
+
+        :returns manifest: the manifest, or None.
+        """
+
+        if not os.path.isfile(self.manifest_path):
+            return None
+
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                manifest = json.loads(manifest_file.read())
+        except ValueError:
+            self.logger.warning('Ignoring unreadable snapshot manifest.')
+            return None
+
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            return None
+
+        if manifest.get('cleaning_version') != CLEANING_VERSION:
+            self.logger.info('Cleaning rules changed, retraining snapshot.')
+            return None
+
+        return manifest
+
+    def fingerprint_sources(self, slack_logs):
+        """Fingerprints the slack logs and external texts.
+
+        :param slack_logs: the slack logs the models are trained from.
+        :returns sources: a dict of channel and external text fingerprints.
+        """
+
+        channel_sources = slack_logs.fingerprint_channels()
+
+        external_text_sources = {
+            os.path.splitext(filename)[0]: fingerprint
+            for filename, fingerprint
+            in fingerprint_directory(self.external_texts_dir).items()}
+
+        return {
+            'channels': channel_sources,
+            'external_texts': external_text_sources,
+        }
+
+    def find_stale_models(self, user_id, username, slack_logs):
+        """Finds the models that have to be retrained because their sources
+        changed since the snapshot was saved.
+
+        :param user_id: the bot's user id.
+        :param username: the bot's username.
+        :param slack_logs: the slack logs the models are trained from.
+        :returns stale: a dict of sets of stale model names by kind.
+        """
+
+        manifest = self.manifest
+
+        if (manifest is None or manifest['user_id'] != user_id or
+                manifest['username'] != username):
+            manifest = {
+                'sources': {'channels': {}, 'external_texts': {}},
+                'models': {kind: {} for kind in MODEL_KINDS},
+                'channel_users': {},
+            }
+
+        sources = self.fingerprint_sources(slack_logs)
+        models = manifest['models']
+
+        stale = {kind: set() for kind in MODEL_KINDS}
+
+        for kind in ('channels', 'external_texts'):
+            old_sources = manifest['sources'][kind]
+            new_sources = sources[kind]
+
+            for name in set(old_sources) | set(new_sources):
+                if (old_sources.get(name) != new_sources.get(name) or
+                        name not in models[kind]):
+                    stale[kind].add(name)
+
+        for channel_name in stale['channels']:
+            stale['users'].update(
+                manifest['channel_users'].get(channel_name, []))
+
+            stale['users'].update(
+                message['user']
+                for message in slack_logs.channel_logs.get(channel_name, [])
+                if 'user' in message)
+
+        stale['users'].update(
+            user for user in slack_logs.user_logs
+            if user not in models['users'])
+
+        self.logger.info(
+            'Snapshot has stale models: {0}'.format(
+                {kind: len(names) for kind, names in stale.items()}))
+
+        return stale
+
+    def model_path(self, kind, name):
+        return os.path.join(self.snapshot_dir, kind, name + '.json')
+
+    def load_model(self, kind, name, text_class=IncrementalText):
+        """Loads a model from the snapshot.
+
+        :param kind: the kind of the model.
+        :param name: the name of the model.
+        :param text_class: the IncrementalText class to load the model as.
+        :returns model: the model, or None if there was no model to save.
+        """
+
+        if not self.manifest['models'][kind].get(name):
+            return None
+
+        with open(self.model_path(kind, name), 'r') as model_file:
+            model_dict = json.loads(model_file.read())
+
+        return text_class.from_dict(model_dict)
+
+    def save(self, user_id, username, models, updated_models, slack_logs):
+        """Saves updated models and a new manifest.
+
+        :param user_id: the bot's user id.
+        :param username: the bot's username.
+        :param models: a dict of dicts of models with their names, by kind.
+            Models that aren't updated may be given as True instead.
+        :param updated_models: a set of (kind, name) pairs to write out.
+        :param slack_logs: the slack logs the models were trained from.
+        """
+
+        self.logger.info(
+            'Saving {0} models to snapshot.'.format(len(updated_models)))
+
+        for kind in MODEL_KINDS:
+            kind_dir = os.path.join(self.snapshot_dir, kind)
+
+            if not os.path.exists(kind_dir):
+                os.makedirs(kind_dir)
+
+            for filename in os.listdir(kind_dir):
+                name = os.path.splitext(filename)[0]
+
+                if models[kind].get(name) is None:
+                    os.remove(os.path.join(kind_dir, filename))
+
+        for kind, name in updated_models:
+            model = models[kind].get(name)
+
+            if model is None:
+                continue
+
+            model_path = self.model_path(kind, name)
+
+            with open(model_path + '.tmp', 'w') as model_file:
+                model_file.write(json.dumps(model.to_dict()))
+
+            os.replace(model_path + '.tmp', model_path)
+
+        channel_users = {
+            channel_name: sorted(set(message['user']
+                                     for message in channel_log
+                                     if 'user' in message))
+            for channel_name, channel_log in slack_logs.channel_logs.items()}
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'cleaning_version': CLEANING_VERSION,
+            'user_id': user_id,
+            'username': username,
+            'sources': self.fingerprint_sources(slack_logs),
+            'models': {kind: {name: model is not None
+                              for name, model in models[kind].items()}
+                       for kind in MODEL_KINDS},
+            'channel_users': channel_users,
+        }
+
+        with open(self.manifest_path + '.tmp', 'w') as manifest_file:
+            manifest_file.write(json.dumps(manifest))
+
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+        self.manifest = manifest
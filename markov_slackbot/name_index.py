@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+
+CHANNEL_EVENTS = ('channel_created', 'channel_rename', 'group_joined',
+                  'group_rename')
+
+USER_EVENTS = ('user_change', 'team_join')
+
+
+class NameIndex(object):
+    """Dicts from the ids of the channels and users of a team to their names
+    and back, in place of searching the client's lists.
+
+    The index is built from the client's server once connected, and kept up
+    to date from RTM events as they are read.
+    """
+
+    def __init__(self):
+        self.channel_names = {}
+        self.channel_ids = {}
+        self.usernames = {}
+        self.user_ids = {}
+        self.lock = threading.Lock()
+
+    def build(self, server):
+        """Indexes the channels and users a connected server knows of.
+
+        :param server: the slackclient Server.
+        """
+
+        with self.lock:
+            self.channel_names = {}
+            self.channel_ids = {}
+            self.usernames = {}
+            self.user_ids = {}
+
+            for channel in server.channels:
+                self.add(self.channel_names, self.channel_ids,
+                         channel.id, channel.name)
+
+            for user in server.users:
+                self.add(self.usernames, self.user_ids, user.id, user.name)
+
+    def add(self, names, ids, item_id, name):
+        old_name = names.get(item_id)
+
+        if old_name is not None and ids.get(old_name) == item_id:
+            del ids[old_name]
+
+        names[item_id] = name
+        ids[name] = item_id
+
+    def update(self, event):
+        """Applies an RTM event that creates or renames a channel or user.
+
+        :param event: an RTM event.
+        """
+
+        event_type = event.get('type')
+
+        if event_type in CHANNEL_EVENTS:
+            channel = event['channel']
+
+            with self.lock:
+                self.add(self.channel_names, self.channel_ids,
+                         channel['id'], channel['name'])
+
+        elif event_type == 'im_created':
+            channel = event['channel']
+
+            # The client names direct message channels after the user.
+            with self.lock:
+                self.add(self.channel_names, self.channel_ids,
+                         channel['id'], channel['user'])
+
+        elif event_type in USER_EVENTS:
+            user = event['user']
+
+            with self.lock:
+                self.add(self.usernames, self.user_ids,
+                         user['id'], user['name'])
+
+    def channel_name(self, channel_id):
+        return self.channel_names.get(channel_id)
+
+    def channel_id(self, channel_name):
+        return self.channel_ids.get(channel_name.lstrip('#'))
+
+    def username(self, user_id):
+        return self.usernames.get(user_id)
+
+    def user_id(self, username):
+        return self.user_ids.get(username.lstrip('@'))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# markovify never tests for more than max_overlap_total + 1 words, 16 by
+# default.
+MAX_NGRAM_LENGTH = 16
+
+HASH_MASK = (1 << 64) - 1
+HASH_MULTIPLIER = 0x9e3779b97f4a7c15
+
+
+class NgramIndex(object):
+    """A Bloom filter of every run of up to max_length consecutive words in
+    the sentences of a text, so that finding out whether a run of words
+    occurs in the text takes time in the length of the run rather than of
+    the text.
+
+    Runs are matched on whole words within a sentence, which differs from
+    markovify searching for the joined run in the joined text both ways. A
+    run found there only inside a longer word, like "he said" in "the said",
+    or only across two sentences is not found here, so the novelty test
+    passes some sentences that markovify would reject. On the other hand,
+    like any Bloom filter it can answer that a run occurs when it doesn't,
+    which rejects some that markovify would pass. It can't forget runs.
+    Once it holds more runs than it was sized for, it reports itself full so
+    it can be rebuilt larger.
+    """
+
+    def __init__(self, capacity=1 << 16, max_length=MAX_NGRAM_LENGTH,
+                 bits_per_ngram=10):
+        """
+        :param capacity: the number of runs to size the filter for.
+        :param max_length: the longest run of words to index.
+        :param bits_per_ngram: the bits of filter per run, which sets the
+            false positive rate. With the two bits set per run, it is about
+            3% at 10.
+        """
+
+        self.capacity = capacity
+        self.max_length = max_length
+        self.size_bits = min(
+            max(capacity * bits_per_ngram - 1, 8).bit_length(), 32)
+        self.bits = bytearray(1 << (self.size_bits - 3))
+        self.count = 0
+
+    def is_full(self):
+        return self.count > self.capacity
+
+    def count_ngrams(self, run_length):
+        """Counts the runs of words add indexes for a sentence.
+
+        :param run_length: the number of words in the sentence.
+        :returns count: the number of runs.
+        """
+
+        short_length = min(run_length, self.max_length)
+
+        return (short_length * (short_length + 1) // 2 +
+                (run_length - short_length) * self.max_length)
+
+    def hash_ngram(self, words):
+        ngram_hash = 0
+
+        for word in words:
+            ngram_hash = ((ngram_hash ^ hash(word)) *
+                          HASH_MULTIPLIER) & HASH_MASK
+
+        return ngram_hash
+
+    def add(self, run):
+        """Adds every run of words within a sentence.
+
+        :param run: the words of the sentence.
+        """
+
+        # The inner loop of indexing, so the hashing is inlined. The two bit
+        # positions are taken from the top and the middle of the hash.
+        bits = self.bits
+        first_shift = 64 - self.size_bits
+        second_shift = first_shift - self.size_bits
+        mask = (1 << self.size_bits) - 1
+        word_hashes = [hash(word) for word in run]
+        word_count = len(run)
+
+        for start in range(word_count):
+            ngram_hash = 0
+
+            for word_hash in word_hashes[start:start + self.max_length]:
+                ngram_hash = ((ngram_hash ^ word_hash) *
+                              HASH_MULTIPLIER) & HASH_MASK
+
+                position = ngram_hash >> first_shift
+                bits[position >> 3] |= 1 << (position & 7)
+                position = (ngram_hash >> second_shift) & mask
+                bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += self.count_ngrams(word_count)
+
+    def __contains__(self, words):
+        """Whether a run of words might occur in a sentence of the text.
+
+        :param words: a list of at most max_length words.
+        """
+
+        if not words:
+            return True
+
+        ngram_hash = self.hash_ngram(words)
+        first_shift = 64 - self.size_bits
+        mask = (1 << self.size_bits) - 1
+
+        for position in (ngram_hash >> first_shift,
+                         (ngram_hash >> (first_shift - self.size_bits)) &
+                         mask):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+
+        return True
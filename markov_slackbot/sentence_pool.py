@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+import logging
+import threading
+import time
+
+
+# The key of the master model among the (kind, name) keys of the others.
+MASTER_KEY = ('master', None)
+
+
+class SentencePool(object):
+    """Sentences generated ahead of time on a background thread for the
+    most requested combinations of models, so that replying to them is a
+    pop rather than a random walk.
+
+    Pools are kept for the master model and the ``max_pools`` most
+    requested combinations. A pool is refilled to ``pool_size`` sentences
+    once it drops below ``refill_threshold``, and sentences older than
+    ``max_age`` seconds are thrown away so that replies keep up with what
+    the models have learned since. Pools of an evicted model are dropped.
+
+    Pools are keyed by the (kind, name) keys of their models rather than the
+    models themselves, so that a pool is never mistaken for one of another
+    model that happens to reuse an identity.
+    """
+
+    def __init__(self, model_controller, pool_size=20, refill_threshold=5,
+                 max_pools=16, max_age=300, refill_interval=1.0):
+        self.logger = logging.getLogger(__name__)
+        self.model_controller = model_controller
+        self.pool_size = pool_size
+        self.refill_threshold = refill_threshold
+        self.max_pools = max_pools
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+
+        # Pool key to [models, weights, deque of (time, sentence), time to
+        # retry filling a pool that its models failed to fill].
+        self.pools = {}
+
+        # Pool key to the number of requests, for the pools kept.
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, keys, weights):
+        return tuple(sorted(zip(keys, weights)))
+
+    def start(self):
+        """Starts the refill thread.
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='sentence-pool')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stops the refill thread.
+        """
+
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+
+    def take(self, keys, models, weights):
+        """Takes a pre-generated sentence for a combination of models.
+
+        :param keys: the (kind, name) of each model.
+        :param models: the distinct models to build a sentence from.
+        :param weights: a weight for each model.
+        :returns sentence: a sentence, or None if the pool is empty.
+        """
+
+        key = self.make_key(keys, weights)
+        sentence = None
+
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            pool = self.pools.get(key)
+
+            if pool is None:
+                self.pools[key] = pool = [list(models), list(weights),
+                                          deque(), 0]
+
+            sentences = pool[2]
+            expired = time.time() - self.max_age
+
+            while sentences:
+                generated, candidate = sentences.popleft()
+
+                if generated >= expired:
+                    sentence = candidate
+                    break
+
+            if len(sentences) < self.refill_threshold:
+                self.wake.set()
+
+        if sentence is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return sentence
+
+    def invalidate(self, model_key):
+        """Drops the pools built from a model that was evicted.
+
+        :param model_key: the (kind, name) of the evicted model.
+        """
+
+        with self.lock:
+            for key in list(self.pools):
+                if any(pool_model_key == model_key
+                       for pool_model_key, weight in key):
+                    self.remove(key)
+
+    def remove(self, key):
+        del self.pools[key]
+        self.requests.pop(key, None)
+
+    def popular_pools(self):
+        """Gets the pools to keep filled, dropping the rest.
+
+        :returns pools: a list of pools.
+        """
+
+        master_key = self.make_key([MASTER_KEY], [1])
+
+        with self.lock:
+            if master_key not in self.pools:
+                self.pools[master_key] = [
+                    [self.model_controller.master_model], [1], deque(), 0]
+
+            popular = sorted(
+                self.pools,
+                key=lambda key: (key != master_key,
+                                 -self.requests.get(key, 0)))
+            kept = popular[:self.max_pools]
+
+            for key in popular[self.max_pools:]:
+                self.remove(key)
+
+            return [self.pools[key] for key in kept]
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.refill_interval)
+            self.wake.clear()
+
+            try:
+                self.refill()
+            except Exception:
+                self.logger.exception('Failed to refill sentence pools.')
+
+    def refill(self):
+        """Tops up every popular pool that has dropped below the refill
+        threshold.
+        """
+
+        for pool in self.popular_pools():
+            models, weights, sentences, retry_at = pool
+
+            if (len(sentences) >= self.refill_threshold or
+                    time.time() < retry_at):
+                continue
+
+            # Models with nothing learned, like the master model before any
+            # logs, have no sentences to give.
+            if not self.model_controller.can_generate(models):
+                continue
+
+            try:
+                self.fill(pool)
+            except Exception:
+                # One broken pool mustn't starve the others, or be retried,
+                # and logged, every refill.
+                pool[3] = time.time() + self.max_age
+                self.logger.exception('Failed to refill a sentence pool.')
+
+    def fill(self, pool):
+        """Generates sentences until a pool is full, or its models fail to
+        make enough of them.
+
+        :param pool: the pool to fill.
+        """
+
+        models, weights, sentences, retry_at = pool
+        failures = 0
+
+        while (len(sentences) < self.pool_size and
+               not self.stopped.is_set()):
+            sentence = self.model_controller.generate_sentence(
+                models, weights)
+
+            if sentence is not None:
+                sentences.append((time.time(), sentence))
+                continue
+
+            failures += 1
+
+            # Sparse models can't fill a pool, so stop trying for a while.
+            if failures >= 20:
+                pool[3] = time.time() + self.max_age
+                break
+
+    def metrics(self):
+        """Gets the hit rate and sizes of the pools.
+
+        :returns metrics: a dict of metrics.
+        """
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'pools': len(self.pools),
+                'sentences': sum(len(pool[2])
+                                 for pool in self.pools.values()),
+            }
@@ -1,126 +1,286 @@
 # -*- coding: utf-8 -*-
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import chain
-import datetime
 import json
 import logging
 import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from markov_slackbot.log_writer import LogWriter, LOG_EXTENSION
+from markov_slackbot.message_cleaner import CLEANED_FIELD, clean_text
+from markov_slackbot.model_snapshot import fingerprint_directory
+
+
+logger = logging.getLogger(__name__)
+
+# Use the faster orjson decoder when it is installed.
+if orjson is not None:
+    json_loads = orjson.loads
+else:
+    json_loads = json.loads
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+# The only fields of a message that training looks at.
+LOG_FIELDS = ('text', 'user', 'channel', 'ts', 'subtype')
+
+# Legacy JSON array logs and line-delimited logs.
+LOG_EXTENSIONS = ('.json', LOG_EXTENSION)
+
+
+def slim_message(message):
+    """Copies the fields of a message that training needs, along with its
+    cleaned text.
+
+    :param message: a message object.
+    :returns slim_message: a message object with only those fields.
+    """
+
+    slim = {field: message[field] for field in LOG_FIELDS if field in message}
+
+    if 'text' in slim:
+        slim[CLEANED_FIELD] = clean_text(slim['text'])
+
+    return slim
+
+
+def is_logfile(log_filename):
+    """Whether a file in a channel folder is a log file, rather than a
+    leftover like the temporary file of an interrupted migration.
+
+    :param log_filename: the name of the file.
+    """
+
+    return os.path.splitext(log_filename)[1] in LOG_EXTENSIONS
+
+
+def iter_logfile(log_filename):
+    """Reads the messages of a log file, either a legacy JSON array or
+    line-delimited JSON, one at a time.
+
+    :param log_filename: the path of the log file.
+    """
+
+    if os.path.splitext(log_filename)[1] != LOG_EXTENSION:
+        with open(log_filename, 'rb') as log_file:
+            for message in json_loads(log_file.read()):
+                yield message
+
+        return
+
+    with open(log_filename, 'rb') as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+
+            try:
+                yield json_loads(line)
+            except ValueError:
+                logger.warning(
+                    'Skipping unreadable line in {0}'.format(log_filename))
+
+
+def read_slim_logfile(log_filename):
+    """Reads a log file keeping only the fields training needs.
+
+    :param log_filename: the path of the log file.
+    :returns channel_log: a list of slim messages.
+    """
+
+    return [slim_message(message) for message in iter_logfile(log_filename)]
+
+
+def ordered_map(executor, function, items, window):
+    """Maps function over items on an executor, yielding the results in
+    order while only running up to window calls ahead of the consumer.
+
+    :param executor: the executor to run the calls on.
+    :param function: the function to call.
+    :param items: the items to call it with.
+    :param window: the number of calls that may be pending at once.
+    """
+
+    pending = deque()
+
+    for item in items:
+        pending.append(executor.submit(function, item))
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
 
 
 class SlackLogs(object):
-    def __init__(self, slack_log_dir):
+    """Slack logs kept in a directory of log folders, one per channel.
+
+    Messages are read a file at a time and only the fields training needs
+    are kept, each message being shared by its channel and user logs.
+    """
+
+    def __init__(self, slack_log_dir, flush_every=1, flush_interval=0,
+                 fsync=False, read_workers=1, read_executor='thread'):
         self.logger = logging.getLogger(__name__)
         self.slack_log_dir = slack_log_dir
+        self.read_workers = read_workers
+        self.read_executor = read_executor
 
         self.prepare_slack_log_dir()
 
-        self.channel_logs = self.read_log_directory()
+        self.log_writer = LogWriter(
+            slack_log_dir,
+            flush_every=flush_every,
+            flush_interval=flush_interval,
+            fsync=fsync)
 
-        self.master_log = list(chain.from_iterable(self.channel_logs.values()))
-        self.user_logs = self.split_log_by_user(self.master_log)
+        self.channel_logs = {}
+        self.user_logs = {}
+
+        for channel_name, message in self.iter_log_directory():
+            self.add_to_memory(message, channel_name)
+
+    @property
+    def master_log(self):
+        return list(chain.from_iterable(self.channel_logs.values()))
 
     def prepare_slack_log_dir(self):
         if not os.path.exists(self.slack_log_dir):
             os.makedirs(self.slack_log_dir)
 
-    def read_log_directory(self):
-        """Reads a directory of slack log folders, returns a dictionary
-        containing the logs as objects with the channels as the keys.
+    def list_logfiles(self):
+        """Lists the log files of every channel in reading order.
 
-        :param slack_log_dir: directory containing slack log folders.
-        :returns logs: dictionary containing slack log data by channel.
+        :returns logfiles: a list of (channel name, log file path) pairs.
         """
-        self.logger.info('Starting log reading.')
 
-        channel_dirs = os.listdir(self.slack_log_dir)
-        channel_paths = [os.path.join(self.slack_log_dir, channel_dir)
-                         for channel_dir in channel_dirs]
+        logfiles = []
 
-        logs = {channel_folder: self.read_channel_logfiles(channel_path)
-                for channel_folder, channel_path
-                in zip(channel_dirs, channel_paths)}
+        for channel_dir in sorted(os.listdir(self.slack_log_dir)):
+            channel_path = os.path.join(self.slack_log_dir, channel_dir)
 
-        return logs
+            logfiles.extend(
+                (channel_dir, os.path.join(channel_path, log_filename))
+                for log_filename in sorted(os.listdir(channel_path))
+                if is_logfile(log_filename))
+
+        return logfiles
+
+    def iter_log_directory(self):
+        """Reads a directory of slack log folders one message at a time.
 
-    def read_channel_logfiles(self, channel_folder):
-        channel_log = [self.read_logfile(os.path.join(
-                        channel_folder, log_filename))
-                       for log_filename
-                       in os.listdir(channel_folder)]
+        With more than one read worker, files are decoded concurrently on a
+        thread or process pool, but messages are still yielded in order.
 
-        return list(chain.from_iterable(channel_log))
+        :returns messages: a generator of (channel name, message) pairs.
+        """
+
+        self.logger.info('Starting log reading.')
+
+        logfiles = self.list_logfiles()
+        paths = [path for channel_name, path in logfiles]
+        read_bytes = 0
+        started = time.time()
+
+        if self.read_workers > 1:
+            executor = EXECUTORS[self.read_executor](self.read_workers)
+            channel_logs = ordered_map(executor, read_slim_logfile, paths,
+                                       self.read_workers * 4)
+        else:
+            executor = None
+            channel_logs = map(read_slim_logfile, paths)
+
+        try:
+            for (channel_name, path), channel_log in zip(logfiles,
+                                                         channel_logs):
+                read_bytes += os.path.getsize(path)
 
-    def read_logfile(self, log_filename):
-        log_file = open(log_filename, 'r')
-        channel_log = json.load(log_file)
-        log_file.close()
+                for message in channel_log:
+                    yield channel_name, message
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
-        return channel_log
+        elapsed = max(time.time() - started, 1e-6)
 
-    def split_log_by_user(self, log):
-        """Splits log into a dict of logs separated by user.
+        self.logger.info(
+            'Read {0} log files, {1} bytes, in {2:.2f}s: {3:.0f} files/s, '
+            '{4:.0f} bytes/s.'.format(
+                len(logfiles), read_bytes, elapsed,
+                len(logfiles) / elapsed, read_bytes / elapsed))
 
-        :param log: the log to split.
-        :returns user_logs: a dict of logs with users as keys.
+    def read_log_directory(self):
+        """Reads a directory of slack log folders, returns a dictionary
+        containing the logs as objects with the channels as the keys.
+
+        :returns logs: dictionary containing slack log data by channel.
         """
 
-        user_logs = {}
+        logs = {}
 
-        for message in log:
-            if 'user' in message:
-                user = message['user']
-                if user in user_logs:
-                    user_logs[user] += [message]
-                else:
-                    user_logs[user] = [message]
+        for channel_name, message in self.iter_log_directory():
+            logs.setdefault(channel_name, []).append(message)
 
-        return user_logs
+        return logs
 
-    def add_to_logs(self, message, channel_name):
-        """Adds a message to logs in memory and saves to log directory.
+    def fingerprint_channels(self):
+        """Fingerprints the log files of every channel.
+
+        :returns fingerprints: a dict of fingerprints with channels as keys.
         """
 
-        if channel_name is None:
-            return
+        return {channel_dir: fingerprint_directory(
+                    os.path.join(self.slack_log_dir, channel_dir))
+                for channel_dir in os.listdir(self.slack_log_dir)}
 
-        self.master_log += message
+    def add_to_logs(self, message, channel_name):
+        """Adds a message to logs in memory and saves to log directory.
 
-        user = message.get('user')
+        :returns logged_message: the message as kept in memory, with its
+            cleaned text.
+        """
 
-        if user in self.user_logs:
-            self.user_logs[user] += [message]
-        else:
-            self.user_logs[user] = [message]
+        if channel_name is None:
+            return message
 
-        if channel_name in self.channel_logs:
-            self.channel_logs[channel_name] += [message]
-        else:
-            self.channel_logs[channel_name] = [message]
+        logged_message = slim_message(message)
 
+        self.add_to_memory(logged_message, channel_name)
         self.write_to_logfile(message, channel_name)
 
-    def write_to_logfile(self, message, channel_name):
-        today = datetime.date.today()
+        return logged_message
 
-        today_string = today.isoformat()
+    def add_to_memory(self, message, channel_name):
+        """Adds a message to the channel and user logs in memory.
+        """
 
-        filename = '{0}.json'.format(today_string)
+        if 'user' in message:
+            self.user_logs.setdefault(message['user'], []).append(message)
 
-        channel_dir = os.path.join(self.slack_log_dir, channel_name)
+        self.channel_logs.setdefault(channel_name, []).append(message)
 
-        if not os.path.exists(channel_dir):
-            os.makedirs(channel_dir)
+    def write_to_logfile(self, message, channel_name):
+        self.log_writer.write(message, channel_name)
 
-        file_path = os.path.join(channel_dir, filename)
+    def flush(self):
+        """Flushes buffered log writes that are due.
+        """
 
-        if os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, 'r') as log_file:
-                existing_log = json.loads(log_file.read())
-            log = existing_log + [message]
-        else:
-            log = [message]
+        self.log_writer.flush_if_due()
 
-        log_json = json.dumps(log, indent=4)
+    def close(self):
+        """Flushes and closes the log files.
+        """
 
-        with open(file_path, 'w+') as log_file:
-            log_file.write(log_json)
+        self.log_writer.close()
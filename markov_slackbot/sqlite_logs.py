@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+from collections.abc import Mapping
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from markov_slackbot.message_cleaner import (CLEANED_FIELD, CLEANING_VERSION,
+                                             clean_text)
+from markov_slackbot.slack_logs import is_logfile, iter_logfile
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    user TEXT,
+    ts TEXT,
+    message TEXT NOT NULL,
+    cleaned_text TEXT,
+    cleaning_version INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+CREATE INDEX IF NOT EXISTS messages_user ON messages (user, id);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    messages INTEGER NOT NULL
+);
+'''
+
+READ_BATCH_SIZE = 1000
+
+
+class StoredLog(object):
+    """A log of messages in the database, read in batches as it is iterated
+    so that it is never held in memory.
+    """
+
+    def __init__(self, logs, **filters):
+        """
+        :param logs: the SqliteLogs the messages are stored in.
+        :param filters: the filters of SqliteLogs.read_messages.
+        """
+
+        self.logs = logs
+        self.filters = filters
+
+    def __len__(self):
+        return self.logs.count_messages(**self.filters)
+
+    def __iter__(self):
+        return self.logs.read_messages(**self.filters)
+
+
+class StoredLogIndex(Mapping):
+    """A read-only dict of StoredLogs by channel or by user.
+    """
+
+    def __init__(self, logs, column, filter_name):
+        """
+        :param logs: the SqliteLogs the messages are stored in.
+        :param column: the column the logs are split by.
+        :param filter_name: the read_messages filter for that column.
+        """
+
+        self.logs = logs
+        self.column = column
+        self.filter_name = filter_name
+
+    def __getitem__(self, value):
+        if value is None or not self.logs.query(
+                'SELECT 1 FROM messages WHERE {0} = ? LIMIT 1'.format(
+                    self.column), (value,)):
+            raise KeyError(value)
+
+        return StoredLog(self.logs, **{self.filter_name: value})
+
+    def __iter__(self):
+        return iter([row[0] for row in self.logs.query(
+            'SELECT DISTINCT {0} FROM messages WHERE {0} IS NOT NULL '
+            'ORDER BY {0}'.format(self.column))])
+
+    def __len__(self):
+        return self.logs.query(
+            'SELECT COUNT(DISTINCT {0}) FROM messages'.format(
+                self.column))[0][0]
+
+
+class SqliteLogs(object):
+    """Slack logs kept in a SQLite database indexed by channel, user and
+    timestamp, in place of a directory of log files.
+
+    It offers the same interface as SlackLogs, but channel_logs, user_logs
+    and master_log are views that stream their messages from the database
+    instead of lists in memory.
+    """
+
+    def __init__(self, database_path, flush_every=1, flush_interval=0,
+                 fsync=False):
+        self.logger = logging.getLogger(__name__)
+        self.database_path = database_path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.unflushed = 0
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+        database_dir = os.path.dirname(database_path)
+
+        if database_dir and not os.path.exists(database_dir):
+            os.makedirs(database_dir)
+
+        self.connection = sqlite3.connect(
+            database_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute(
+            'PRAGMA synchronous = {0}'.format('FULL' if fsync else 'NORMAL'))
+        self.connection.executescript(SCHEMA)
+        self.upgrade_schema()
+        self.reclean()
+
+        self.channel_logs = StoredLogIndex(self, 'channel', 'channel_name')
+        self.user_logs = StoredLogIndex(self, 'user', 'user')
+        self.master_log = StoredLog(self)
+
+    def upgrade_schema(self):
+        """Adds the cleaned text columns to databases created without them.
+        """
+
+        columns = set(row[1] for row in self.query(
+            'PRAGMA table_info(messages)'))
+
+        for column, column_type in (('cleaned_text', 'TEXT'),
+                                    ('cleaning_version', 'INTEGER')):
+            if column not in columns:
+                self.query('ALTER TABLE messages ADD COLUMN {0} {1}'.format(
+                    column, column_type))
+
+    def reclean(self):
+        """Cleans the text of every message stored with another cleaning
+        version than the current one.
+        """
+
+        sql = ('SELECT id, message FROM messages '
+               'WHERE cleaning_version IS NOT ? AND id > ? '
+               'ORDER BY id LIMIT ?')
+        last_id = 0
+        recleaned = 0
+
+        while True:
+            rows = self.query(
+                sql, (CLEANING_VERSION, last_id, READ_BATCH_SIZE))
+
+            with self.lock:
+                self.connection.executemany(
+                    'UPDATE messages SET cleaned_text = ?, '
+                    'cleaning_version = ? WHERE id = ?',
+                    ((self.clean(json.loads(message)), CLEANING_VERSION,
+                      message_id)
+                     for message_id, message in rows))
+                self.connection.commit()
+
+            recleaned += len(rows)
+
+            if len(rows) < READ_BATCH_SIZE:
+                break
+
+            last_id = rows[-1][0]
+
+        if recleaned:
+            self.logger.info('Cleaned {0} stored messages.'.format(
+                recleaned))
+
+    def clean(self, message):
+        if 'text' not in message:
+            return None
+
+        return clean_text(message['text'])
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def where(self, channel_name=None, user=None, since=None, until=None):
+        """Builds the conditions selecting messages that match every given
+        filter.
+
+        :param channel_name: only messages sent to this channel.
+        :param user: only messages sent by this user.
+        :param since: only messages with a timestamp from this one on.
+        :param until: only messages with a timestamp before this one.
+        :returns conditions, params: SQL conditions, each followed by AND,
+            and their parameters.
+        """
+
+        conditions = ''
+        params = ()
+
+        for condition, value in (('channel = ?', channel_name),
+                                 ('user = ?', user),
+                                 ('ts >= ?', since),
+                                 ('ts < ?', until)):
+            if value is not None:
+                conditions += condition + ' AND '
+                params += (value,)
+
+        return conditions, params
+
+    def count_messages(self, **filters):
+        """Counts the messages matching every given filter.
+
+        :param filters: the filters of where.
+        :returns count: the number of messages.
+        """
+
+        conditions, params = self.where(**filters)
+
+        return self.query(
+            'SELECT COUNT(*) FROM messages WHERE {0}1'.format(conditions),
+            params)[0][0]
+
+    def read_messages(self, **filters):
+        """Streams the messages matching every given filter, in the order
+        they were logged.
+
+        :param filters: the filters of where.
+        """
+
+        conditions, params = self.where(**filters)
+        sql = ('SELECT id, message, cleaned_text FROM messages '
+               'WHERE {0}id > ? ORDER BY id LIMIT ?').format(conditions)
+        last_id = 0
+
+        while True:
+            rows = self.query(sql, params + (last_id, READ_BATCH_SIZE))
+
+            for last_id, message, cleaned in rows:
+                message = json.loads(message)
+
+                if cleaned is not None:
+                    message[CLEANED_FIELD] = cleaned
+
+                yield message
+
+            if len(rows) < READ_BATCH_SIZE:
+                return
+
+    def fingerprint_channels(self):
+        """Fingerprints every channel by message count and last message id.
+
+        :returns fingerprints: a dict of fingerprints with channels as keys.
+        """
+
+        return {channel_name: [count, last_id]
+                for channel_name, count, last_id in self.query(
+                    'SELECT channel, COUNT(*), MAX(id) FROM messages '
+                    'GROUP BY channel')}
+
+    def insert(self, messages):
+        """Inserts (channel name, message) pairs, with the cleaned text of
+        each message, without committing.
+
+        :param messages: an iterable of (channel name, message) pairs.
+        :returns count: the number of messages inserted.
+        """
+
+        with self.lock:
+            return self.connection.executemany(
+                'INSERT INTO messages (channel, user, ts, message, '
+                'cleaned_text, cleaning_version) VALUES (?, ?, ?, ?, ?, ?)',
+                (self.row(channel_name, message)
+                 for channel_name, message in messages)).rowcount
+
+    def row(self, channel_name, message):
+        """Builds the row of a message, reusing its cleaned text if it has
+        any.
+        """
+
+        message = dict(message)
+        cleaned = message.pop(CLEANED_FIELD, None)
+
+        if cleaned is None:
+            cleaned = self.clean(message)
+
+        return (channel_name, message.get('user'), message.get('ts'),
+                json.dumps(message), cleaned, CLEANING_VERSION)
+
+    def add_to_logs(self, message, channel_name):
+        """Adds a message to the database, committing it once enough
+        messages or time have passed.
+
+        :returns logged_message: the message with its cleaned text.
+        """
+
+        if channel_name is None:
+            return message
+
+        logged_message = dict(message)
+
+        if 'text' in message:
+            logged_message[CLEANED_FIELD] = self.clean(message)
+
+        self.insert([(channel_name, logged_message)])
+        self.unflushed += 1
+
+        if self.unflushed >= self.flush_every:
+            self.commit()
+
+        return logged_message
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+        self.unflushed = 0
+        self.last_flush = time.time()
+
+    def flush(self):
+        """Commits added messages if they are due.
+        """
+
+        if (self.unflushed and
+                time.time() - self.last_flush >= self.flush_interval):
+            self.commit()
+
+    def close(self):
+        """Commits added messages and closes the database.
+        """
+
+        self.commit()
+
+        with self.lock:
+            self.connection.close()
+
+    def import_log_directory(self, slack_log_dir):
+        """Bulk loads a directory of slack log folders into the database.
+
+        Files are imported once; files imported before are skipped.
+
+        :param slack_log_dir: directory containing slack log folders.
+        :returns imported: the number of messages imported.
+        """
+
+        imported = 0
+        imported_files = set(row[0] for row in self.query(
+            'SELECT path FROM imported_files'))
+
+        for channel_name in sorted(os.listdir(slack_log_dir)):
+            channel_path = os.path.join(slack_log_dir, channel_name)
+
+            if not os.path.isdir(channel_path):
+                continue
+
+            for log_filename in sorted(os.listdir(channel_path)):
+                relative_path = os.path.join(channel_name, log_filename)
+
+                if (not is_logfile(log_filename) or
+                        relative_path in imported_files):
+                    continue
+
+                count = self.insert(
+                    (channel_name, message)
+                    for message in iter_logfile(
+                        os.path.join(channel_path, log_filename)))
+
+                with self.lock:
+                    self.connection.execute(
+                        'INSERT INTO imported_files VALUES (?, ?)',
+                        (relative_path, count))
+                    self.connection.commit()
+
+                imported += count
+
+        self.logger.info('Imported {0} messages.'.format(imported))
+
+        return imported
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+
+
+class TrainingWorker(object):
+    """Logs and learns messages on a background thread so that responding
+    never waits on training.
+
+    Messages wait in a bounded queue. When it is full, submitting blocks for
+    up to ``put_timeout`` seconds to push back on the reader, after which the
+    message is dropped from training and counted.
+
+    Messages are logged as soon as they are taken off the queue, but the
+    models of their channel are only marked dirty. A dirty channel's messages
+    are learned together once ``batch_size`` of them are waiting, once the
+    channel has been quiet for ``batch_interval`` seconds, or at the latest
+    ``max_staleness`` seconds after it was first marked dirty.
+    """
+
+    def __init__(self, model_controller, slack_logs, max_queue_size=1000,
+                 put_timeout=1.0, idle_timeout=0.5, batch_size=50,
+                 batch_interval=1.0, max_staleness=5.0):
+        self.logger = logging.getLogger(__name__)
+        self.model_controller = model_controller
+        self.slack_logs = slack_logs
+        self.put_timeout = put_timeout
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_staleness = max_staleness
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+
+        # Channel name to [messages, dirty since, last message time].
+        self.dirty_channels = {}
+
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+
+    def start(self):
+        """Starts the worker thread.
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.thread = threading.Thread(
+            target=self.run, name='training-worker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Finishes the queued messages and stops the worker thread.
+        """
+
+        if self.thread is None:
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def submit(self, message, channel_name):
+        """Queues a message to be logged and learned.
+
+        :param message: the message.
+        :param channel_name: the name of the channel it was sent to.
+        :returns queued: whether the message was queued.
+        """
+
+        started = time.time()
+
+        try:
+            self.queue.put((message, channel_name), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            self.logger.warning(
+                'Training queue full, dropped message. Metrics: {0}'.format(
+                    self.metrics()))
+            return False
+        finally:
+            self.blocked_seconds += time.time() - started
+
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+        return True
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.next_timeout())
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                self.learn_dirty(force=True)
+                self.slack_logs.flush()
+                return
+
+            if item:
+                message, channel_name = item
+
+                try:
+                    self.log(message, channel_name)
+                except Exception:
+                    self.failed += 1
+                    self.logger.exception('Failed to log message.')
+
+                self.processed += 1
+
+            self.learn_dirty()
+
+            try:
+                self.model_controller.reindex_master_model()
+            except Exception:
+                self.logger.exception('Failed to rebuild the master index.')
+
+            if self.queue.empty():
+                self.slack_logs.flush()
+
+    def next_timeout(self):
+        """Gets how long to wait for a message before a dirty channel is due.
+
+        :returns timeout: the number of seconds to wait.
+        """
+
+        timeout = self.idle_timeout
+        now = time.time()
+
+        for messages, dirty_since, last_message in \
+                self.dirty_channels.values():
+            due = min(last_message + self.batch_interval,
+                      dirty_since + self.max_staleness)
+            timeout = min(timeout, due - now)
+
+        return max(timeout, 0)
+
+    def log(self, message, channel_name):
+        """Logs a message and marks the models of its channel dirty.
+
+        :param message: the message.
+        :param channel_name: the name of the channel it was sent to.
+        """
+
+        self.logger.debug('Adding message to log.')
+        message = self.model_controller.log_message(
+            self.slack_logs, message, channel_name)
+
+        now = time.time()
+        dirty = self.dirty_channels.get(channel_name)
+
+        if dirty is None:
+            dirty = self.dirty_channels[channel_name] = [[], now, now]
+
+        dirty[0].append(message)
+        dirty[2] = now
+
+    def learn_dirty(self, force=False):
+        """Learns the messages of every dirty channel that is due.
+
+        :param force: whether to learn every dirty channel regardless.
+        """
+
+        now = time.time()
+
+        for channel_name, dirty in list(self.dirty_channels.items()):
+            messages, dirty_since, last_message = dirty
+
+            if (force or len(messages) >= self.batch_size or
+                    now - last_message >= self.batch_interval or
+                    now - dirty_since >= self.max_staleness):
+                del self.dirty_channels[channel_name]
+                self.learn(messages, channel_name)
+
+    def learn(self, messages, channel_name):
+        """Teaches logged messages from a channel to the models.
+
+        :param messages: the logged messages.
+        :param channel_name: the name of the channel they were sent to.
+        """
+
+        self.logger.debug('Updating models with {0} messages.'.format(
+            len(messages)))
+
+        try:
+            self.model_controller.update_slack_models(
+                self.slack_logs,
+                channel_name,
+                messages)
+        except Exception:
+            self.failed += len(messages)
+            self.logger.exception('Failed to learn messages.')
+
+        self.batches += 1
+
+    def metrics(self):
+        """Gets the backpressure metrics of the worker.
+
+        :returns metrics: a dict of metrics.
+        """
+
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'dirty_channels': len(self.dirty_channels),
+            'blocked_seconds': self.blocked_seconds,
+        }
@@ -43,6 +43,9 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'fast_json': ['orjson'],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='markov_slackbot',
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_async_runtime
+----------------------------------
+
+Tests for `markov_slackbot.async_runtime` module.
+"""
+
+import json
+import socket
+import threading
+
+from markov_slackbot.async_runtime import AsyncRuntime
+
+
+class FakeSlackClient(object):
+    """Reads line-delimited events from a socket, like the RTM websocket.
+    """
+
+    def __init__(self, sock):
+        self.server = self
+        self.websocket = self
+        self.sock = sock
+        self.sent = []
+
+    def rtm_read(self):
+        try:
+            data = self.sock.recv(4096)
+        except BlockingIOError:
+            return []
+
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def rtm_send_message(self, channel, message):
+        self.sent.append((channel, message))
+
+
+class FakeBot(object):
+
+    def __init__(self, sock):
+        self.slack_client = FakeSlackClient(sock)
+        self.message_interpreter = self
+        self.model_controller = self
+        self.name_index = self
+        self.learned = []
+        self.replied = threading.Event()
+
+    def connect(self):
+        pass
+
+    def start_services(self):
+        pass
+
+    def autoping(self):
+        pass
+
+    def report_metrics(self):
+        pass
+
+    def update(self, event):
+        pass
+
+    def is_respondable(self, message):
+        return 'bot' in message['text']
+
+    def is_learnable(self, message):
+        return True
+
+    def respond(self, message):
+        self.slack_client.rtm_send_message(
+            message['channel'], 'Reply to ' + message['text'])
+        self.replied.set()
+
+    def learn_message(self, message):
+        self.learned.append(message['text'])
+
+
+class TestAsyncRuntime(object):
+
+    def test_events_are_dispatched_as_they_arrive(self):
+        reader, writer = socket.socketpair()
+        reader.setblocking(False)
+        bot = FakeBot(reader)
+        runtime = AsyncRuntime(bot, workers=2, ping_interval=10)
+        thread = threading.Thread(target=runtime.run)
+        thread.start()
+
+        for text in ('first', 'second', 'hello bot'):
+            writer.send(json.dumps(
+                {'channel': 'C00000001', 'text': text}).encode() + b'\n')
+
+        assert bot.replied.wait(5)
+
+        runtime.stop()
+        thread.join(5)
+        writer.close()
+        reader.close()
+
+        assert not thread.is_alive()
+        assert bot.learned == ['first', 'second']
+        assert bot.slack_client.sent == [('C00000001', 'Reply to hello bot')]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_benchmark
+----------------------------------
+
+Tests for `markov_slackbot.benchmark` module.
+"""
+
+import json
+import os
+
+import pytest
+
+from markov_slackbot.benchmark import compare_results
+from markov_slackbot.benchmark import generate_export
+from markov_slackbot.benchmark import prepare_export
+from markov_slackbot.benchmark import run_benchmark
+
+
+def read_export(export_dir):
+    files = {}
+
+    for channel_name in os.listdir(export_dir):
+        channel_dir = os.path.join(export_dir, channel_name)
+
+        for log_name in os.listdir(channel_dir):
+            with open(os.path.join(channel_dir, log_name)) as log_file:
+                files[(channel_name, log_name)] = log_file.read()
+
+    return files
+
+
+class TestBenchmark(object):
+    def test_exports_are_deterministic(self, tmpdir):
+        first = str(tmpdir.join('first'))
+        second = str(tmpdir.join('second'))
+
+        generate_export(first, channels=3, users=5, messages=200, seed=7)
+        generate_export(second, channels=3, users=5, messages=200, seed=7)
+
+        export = read_export(first)
+        messages = [json.loads(line) for log in export.values()
+                    for line in log.splitlines()]
+
+        assert export == read_export(second)
+        assert len(messages) == 200
+        assert {message['user'] for message in messages} <= {
+            'U{0:08d}'.format(i) for i in range(5)}
+
+    def test_exports_are_regenerated_for_other_parameters(self, tmpdir):
+        export_dir = str(tmpdir.join('export'))
+
+        assert prepare_export(export_dir, channels=3, messages=100)
+        first = read_export(export_dir)
+
+        assert not prepare_export(export_dir, channels=3, messages=100)
+        assert read_export(export_dir) == first
+
+        assert prepare_export(export_dir, channels=2, messages=100)
+        assert len({channel_name for channel_name, log_name
+                    in read_export(export_dir)}) == 2
+
+        other_dir = tmpdir.mkdir('other')
+        other_dir.mkdir('general')
+
+        with pytest.raises(ValueError):
+            prepare_export(str(other_dir), channels=3, messages=100)
+
+        assert os.listdir(str(other_dir)) == ['general']
+
+    def test_results_compare_with_a_baseline(self):
+        results = run_benchmark(channels=3, users=5, messages=300,
+                                requests=8, writes=20, measure_memory=False)
+
+        assert set(results['stages']) == {
+            'ingest', 'write_logs', 'startup', 'train_channel', 'learn',
+            'generate'}
+        assert results['stages']['ingest']['count'] == 300
+        assert results['stages']['generate']['latency_ms']['p50'] >= 0
+
+        comparison = compare_results(results, json.loads(json.dumps(results)))
+
+        assert comparison['learn']['throughput'] == 0
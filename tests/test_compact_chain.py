@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compact_chain
+----------------------------------
+
+Tests for `markov_slackbot.compact_chain` module.
+"""
+
+from markov_slackbot.compact_chain import CompactText, Vocabulary
+from markov_slackbot.incremental_text import AggregateText, IncrementalText
+from markov_slackbot.model_cache import estimate_text_size
+
+
+MESSAGES = [
+    'Hello there. How are you?',
+    'fine thanks',
+    'Hello there friend!',
+    'How are things? Fine.',
+]
+
+
+class TestCompactChain(object):
+
+    def test_matches_dict_chain(self):
+        compact = CompactText(MESSAGES[0])
+        expected = IncrementalText(MESSAGES[0])
+
+        for message in MESSAGES[1:]:
+            compact.add_text(message, separator='.\n')
+            expected.add_text(message, separator='.\n')
+
+        assert dict(compact.chain.model) == dict(expected.chain.model)
+
+        loaded = CompactText.from_dict(compact.to_dict())
+
+        assert dict(loaded.chain.model) == dict(expected.chain.model)
+
+    def test_walk_follows_transitions(self):
+        model = CompactText('The only sentence here.')
+
+        assert model.chain.walk() == ['The', 'only', 'sentence', 'here.']
+
+    def test_aggregate_of_compact_chains(self):
+        models = [CompactText(message) for message in MESSAGES]
+        master = AggregateText(models, chain_class=CompactText.chain_class)
+        expected = AggregateText([IncrementalText(message)
+                                  for message in MESSAGES])
+
+        assert dict(master.chain.model) == dict(expected.chain.model)
+
+    def test_vocabulary_is_shared(self):
+        vocabulary = Vocabulary()
+        chain_class = CompactText.chain_class
+
+        first = chain_class([['a', 'b']], 2, vocabulary=vocabulary)
+        chain_class([['a', 'b', 'c']], 2, vocabulary=vocabulary)
+
+        assert len(vocabulary) == 5
+        assert first.walk() == ['a', 'b']
+
+    def test_sizing_leaves_updates_staged(self):
+        model = CompactText(MESSAGES[0])
+        model.add_text(MESSAGES[1], separator='.\n')
+
+        assert model.chain.pending
+        assert estimate_text_size(model)
+        assert model.chain.pending
+
+    def test_sentences_are_kept_as_ids(self):
+        compact = CompactText(MESSAGES[0])
+        expected = IncrementalText(MESSAGES[0])
+
+        for message in MESSAGES[1:]:
+            compact.add_text(message, separator='.\n')
+            expected.add_text(message, separator='.\n')
+
+        assert not compact._input_parts
+        assert compact.rejoined_text == expected.rejoined_text
+        assert list(compact.iter_runs()) == list(expected.iter_runs())
+
+        loaded = CompactText.from_dict(compact.to_dict())
+
+        assert loaded.rejoined_text == expected.rejoined_text
+        assert loaded.text_size() == compact.text_size()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_composite_text
+----------------------------------
+
+Tests for `markov_slackbot.composite_text` module.
+"""
+
+import markovify
+
+from markov_slackbot.composite_text import CompositeText
+from markov_slackbot.incremental_text import IncrementalText
+
+
+class TestCompositeText(object):
+
+    def test_transitions_match_combine(self):
+        models = [IncrementalText('The cat sat. The dog ran. A cat ran.'),
+                  IncrementalText('The dog sat. The bird flew.'),
+                  IncrementalText('A bird sat. The cat flew.')]
+        weights = [1, 2, 0.5]
+
+        composite = CompositeText(models, weights)
+        combined = markovify.combine(models, weights)
+
+        for state, follows in combined.chain.model.items():
+            choices, cumdist = composite.chain.transitions(state)
+            weights = [cumdist[0]] + [
+                b - a for a, b in zip(cumdist, cumdist[1:])]
+
+            assert dict(zip(choices, weights)) == follows
+
+    def test_sees_learned_text(self):
+        first = IncrementalText('Only one sentence here.')
+        second = IncrementalText('Another sentence here.')
+        composite = CompositeText([first, second])
+
+        composite.chain.walk()
+        second.add_text('Brand new words!', separator='.\n')
+
+        sentences = set(' '.join(composite.chain.walk()) for _ in range(200))
+
+        assert 'Brand new words!' in sentences
+        assert composite.test_sentence_output(
+            ['Brand', 'new', 'words!'], 0.7, 15) is False
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_incremental_text
+----------------------------------
+
+Tests for `markov_slackbot.incremental_text` module.
+"""
+
+import markovify
+
+from markov_slackbot.incremental_text import AggregateText, IncrementalText
+
+
+MESSAGES = [
+    'Hello there. How are you?',
+    'fine thanks',
+    'lowercase start joins the previous sentence',
+    'Mr. Smith went to Washington!',
+    'trailing whitespace ',
+    'Is it? yes it is.',
+    '',
+    'The end.',
+]
+
+
+class TestIncrementalText(object):
+
+    def test_messages_match_full_retrain(self):
+        model = IncrementalText(MESSAGES[0])
+
+        for i, message in enumerate(MESSAGES[1:], 2):
+            model.add_text(message, separator='.\n')
+            retrained = markovify.Text('.\n'.join(MESSAGES[:i]))
+
+            assert model.chain.model == retrained.chain.model
+            assert model.rejoined_text == retrained.rejoined_text
+            assert model.input_text == retrained.input_text
+
+    def test_chunks_match_full_retrain(self):
+        text = ' '.join(MESSAGES) * 3
+        model = IncrementalText('')
+
+        for i in range(0, len(text), 7):
+            model.add_text(text[i:i + 7])
+
+        retrained = markovify.Text(text)
+
+        assert model.chain.model == retrained.chain.model
+        assert model.rejoined_text == retrained.rejoined_text
+
+    def test_streamed_chunks_keep_no_text(self):
+        text = ' '.join(MESSAGES) * 3
+        model = IncrementalText('', retain_original=False)
+
+        for i in range(0, len(text), 7):
+            model.add_text(text[i:i + 7])
+
+        assert model.chain.model == markovify.Text(text).chain.model
+        assert model.text_size() == 0
+        assert model.test_sentence_output(['Hello', 'there.'], 0.7, 15)
+
+    def test_empty_model(self):
+        model = IncrementalText('An (aside)')
+
+        assert model.is_empty()
+
+        model.add_text('Now it has text.', separator='.\n')
+
+        assert not model.is_empty()
+        assert model.chain.walk() == ['Now', 'it', 'has', 'text.']
+
+
+class TestAggregateText(object):
+
+    def test_follows_underlying_models(self):
+        general = IncrementalText(MESSAGES[0])
+        random = IncrementalText(MESSAGES[1])
+        master = AggregateText([general, random])
+
+        for message in MESSAGES[2:]:
+            master.apply(*general.add_text(message, separator='.\n'))
+
+        combined = markovify.combine([general, random])
+
+        assert master.chain.model == combined.chain.model
+
+        master.remove_model(random)
+
+        assert master.chain.model == general.chain.model
@@ -8,6 +8,11 @@ test_markov_slackbot
 Tests for `markov_slackbot` module.
 """
 
+import json
+import logging
+import os
+import sqlite3
+
 import pytest
 
 from contextlib import contextmanager
@@ -34,6 +39,106 @@ class TestMarkov_slackbot(object):
         assert help_result.exit_code == 0
         assert '--help  Show this message and exit.' in help_result.output
 
+    def test_metrics_are_logged(self, tmpdir, caplog):
+        tmpdir.mkdir('external_texts')
+        bot = markov_slackbot.MarkovSlackbot({
+            'slack_log_dir': str(tmpdir.join('slack_logs')),
+            'external_texts_dir': str(tmpdir.join('external_texts')),
+            'SILENT_CHANNELS_FILE': str(tmpdir.join('silent.json')),
+            'LOG_LEVEL': 'INFO',
+        })
+
+        with caplog.at_level(logging.INFO):
+            bot.report_metrics()
+            bot.report_metrics()
+
+        reports = [record.getMessage() for record in caplog.records
+                   if record.getMessage().startswith('Metrics: ')]
+
+        assert len(reports) == 1
+        assert json.loads(reports[0][len('Metrics: '):])['sender'][
+            'submitted'] == 0
+
+    def test_failed_metrics_are_logged(self, tmpdir, caplog):
+        tmpdir.mkdir('external_texts')
+        bot = markov_slackbot.MarkovSlackbot({
+            'slack_log_dir': str(tmpdir.join('slack_logs')),
+            'external_texts_dir': str(tmpdir.join('external_texts')),
+            'SILENT_CHANNELS_FILE': str(tmpdir.join('silent.json')),
+            'LOG_LEVEL': 'INFO',
+        })
+
+        def metrics():
+            raise RuntimeError('dictionary changed size during iteration')
+
+        bot.metrics = metrics
+
+        with caplog.at_level(logging.INFO):
+            bot.report_metrics()
+
+        assert [record.getMessage() for record in caplog.records] == [
+            'Failed to report metrics.']
+
+    def test_snapshot_needs_a_snapshot_dir(self, tmpdir):
+        tmpdir.mkdir('external_texts')
+        config = {
+            'slack_log_dir': str(tmpdir.join('slack_logs')),
+            'external_texts_dir': str(tmpdir.join('external_texts')),
+            'SILENT_CHANNELS_FILE': str(tmpdir.join('silent.json')),
+            'LOG_LEVEL': 'INFO',
+            'log_backend': 'sqlite',
+            'log_database': str(tmpdir.join('slack_logs.db')),
+        }
+        bot = markov_slackbot.MarkovSlackbot(config)
+
+        with pytest.raises(ValueError):
+            bot.build_snapshot()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            bot.slack_logs.connection.execute('SELECT 1')
+
+        config_file = tmpdir.join('config.json')
+        config_file.write(json.dumps(config))
+        result = CliRunner().invoke(cli.build_model_snapshot,
+                                    ['--config_file', str(config_file)])
+
+        assert result.exit_code == 1
+        assert 'No model_snapshot_dir is configured' in result.output
+
+    def test_sqlite_logs_are_snapshotted_on_shutdown(self, tmpdir):
+        tmpdir.mkdir('external_texts')
+        snapshot_dir = tmpdir.join('snapshot')
+        bot = markov_slackbot.MarkovSlackbot({
+            'slack_log_dir': str(tmpdir.join('slack_logs')),
+            'external_texts_dir': str(tmpdir.join('external_texts')),
+            'SILENT_CHANNELS_FILE': str(tmpdir.join('silent.json')),
+            'LOG_LEVEL': 'INFO',
+            'log_backend': 'sqlite',
+            'log_database': str(tmpdir.join('slack_logs.db')),
+            'model_snapshot_dir': str(snapshot_dir),
+            'metrics_interval': 0,
+        })
+
+        def main_loop():
+            bot.user_id, bot.username = 'U0000000B', 'bot'
+            bot.start_services()
+            bot.training_worker.submit(
+                {'type': 'message', 'user': 'U00000001',
+                 'text': 'Hello there.', 'ts': '1468627200.000000'},
+                'general')
+            raise KeyboardInterrupt()
+
+        bot.main_loop = main_loop
+
+        with pytest.raises(KeyboardInterrupt):
+            bot.start()
+
+        assert os.path.exists(
+            str(snapshot_dir.join('channels', 'general.json')))
+
+        with open(str(snapshot_dir.join('manifest.json'))) as manifest:
+            assert 'general' in json.load(manifest)['sources']['channels']
+
     @classmethod
     def teardown_class(cls):
         pass
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_message_cleaner
+----------------------------------
+
+Tests for `markov_slackbot.message_cleaner` module.
+"""
+
+from markov_slackbot.message_cleaner import clean_text, cleaned_text
+
+
+class TestMessageCleaner(object):
+
+    def test_every_rule_is_applied(self):
+        assert clean_text('Look ```code\nblock``` at <http://a.b> this') == (
+            'Look  at  this')
+
+    def test_cleaned_text_is_reused(self):
+        assert cleaned_text({'text': '<x>Hi'}) == 'Hi'
+        assert cleaned_text({'text': '<x>Hi', 'cleaned_text': 'Cached'}) == (
+            'Cached')
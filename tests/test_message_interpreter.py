@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_message_interpreter
+----------------------------------
+
+Tests for `markov_slackbot.message_interpreter` module.
+"""
+
+from markov_slackbot.message_interpreter import MessageInterpreter
+
+
+class TestMessageInterpreter(object):
+
+    def build_interpreter(self):
+        return MessageInterpreter('U0000000B', 'bot',
+                                  ['help', 'silence', 'speak'],
+                                  ['book', 'book2', 'war'])
+
+    def test_parse_finds_everything_in_one_pass(self):
+        parsed_message = self.build_interpreter().parse(
+            'speak like <@U00000001> in <#C00000001> from slack, '
+            '$war and $ bo ok2 then $war, be helpful')
+
+        assert parsed_message.commands == ['help', 'speak']
+        assert parsed_message.masters == ['slack']
+        assert parsed_message.channels == ['C00000001']
+        assert parsed_message.users == ['U00000001']
+        assert parsed_message.external_texts == ['book', 'book2',
+                                                 'war', 'war']
+
+    def test_find_methods_match_parse(self):
+        interpreter = self.build_interpreter()
+        message_text = 'master $book help'
+
+        assert interpreter.find_commands(message_text) == ['help']
+        assert interpreter.find_master(message_text) == ['master']
+        assert interpreter.find_external_texts(message_text) == ['book']
+        assert interpreter.find_channels(message_text) == []
+        assert interpreter.find_users(message_text) == []
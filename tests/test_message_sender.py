@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_message_sender
+----------------------------------
+
+Tests for `markov_slackbot.message_sender` module.
+"""
+
+from markov_slackbot.message_sender import MessageSender
+
+
+class TestMessageSender(object):
+
+    def test_waiting_messages_are_coalesced(self):
+        sent = []
+        sender = MessageSender(lambda channel, text: sent.append(
+            (channel, text)), rate=100, burst=1, channel_burst=1)
+
+        for i in range(3):
+            sender.send('C00000001', 'Message {0}.'.format(i))
+
+        sender.send('C00000002', 'Elsewhere.')
+        sender.start()
+        sender.stop()
+
+        assert sent == [
+            ('C00000001', 'Message 0.\nMessage 1.\nMessage 2.'),
+            ('C00000002', 'Elsewhere.'),
+        ]
+        assert sender.metrics()['coalesced'] == 2
+        assert sender.metrics()['depth'] == 0
+
+    def test_failed_sends_are_retried(self):
+        attempts = []
+
+        def send_function(channel, text):
+            attempts.append(text)
+
+            if len(attempts) < 3:
+                raise IOError('Disconnected.')
+
+        sender = MessageSender(send_function, retry_backoff=0.01,
+                               channel_rate=100)
+        sender.send('C00000001', 'Hello.')
+        sender.start()
+        sender.stop()
+
+        assert attempts == ['Hello.'] * 3
+        assert sender.metrics()['retries'] == 2
+        assert sender.metrics()['sent'] == 1
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_model_cache
+----------------------------------
+
+Tests for `markov_slackbot.model_cache` module.
+"""
+
+import json
+
+from markov_slackbot.incremental_text import IncrementalText
+from markov_slackbot.model_cache import CombinedModelCache
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.slack_logs import SlackLogs
+from markov_slackbot.training_worker import TrainingWorker
+
+
+class TestCombinedModelCache(object):
+
+    def test_combinations_are_reused_until_invalidated(self):
+        cache = CombinedModelCache(1024 * 1024)
+        first = IncrementalText('The first text. It has sentences.')
+        second = IncrementalText('The second text. It has more.')
+
+        combined = cache.combine([first, second])
+
+        assert cache.combine([second, first]) is combined
+        assert cache.hits == 1
+
+        second.add_text('Something new.', separator='.\n')
+        cache.invalidate(second)
+
+        assert not cache.entries
+        assert cache.combine([first, second]) is not combined
+
+    def test_budget_evicts_least_recently_used(self):
+        models = [IncrementalText('Text number {0}.'.format(i))
+                  for i in range(4)]
+        cache = CombinedModelCache(1024 * 1024)
+        cache.combine(models[:2])
+        cache.max_size = cache.size
+
+        cache.combine(models[2:])
+
+        assert len(cache.entries) == 1
+        assert cache.size <= cache.max_size
+
+
+class TestModelCache(object):
+
+    def build_logs(self, tmpdir):
+        logs = tmpdir.mkdir('logs')
+
+        for channel_name in ('general', 'random', 'music'):
+            logs.mkdir(channel_name).join('2016-07-16.jsonl').write(
+                '\n'.join(json.dumps({
+                    'type': 'message',
+                    'user': 'U0000000{0}'.format(i % 3),
+                    'text': 'Talking about {0} number {1} today.'.format(
+                        channel_name, i)}) for i in range(20)) + '\n')
+
+        return SlackLogs(str(logs))
+
+    def test_evicted_models_are_rebuilt(self, tmpdir):
+        slack_logs = self.build_logs(tmpdir)
+        unbounded = ModelController('U0000000B', 'bot', slack_logs, {})
+        bounded = ModelController('U0000000B', 'bot', slack_logs, {},
+                                  model_cache_size=1)
+
+        assert bounded.models.metrics()['resident'] == 1
+        assert bounded.models.evictions == 5
+        assert sorted(bounded.channel_models) == ['general', 'music',
+                                                  'random']
+        assert (bounded.master_model.chain.model ==
+                unbounded.master_model.chain.model)
+
+        for name, model in unbounded.channel_models.items():
+            assert (bounded.channel_models[name].chain.model ==
+                    model.chain.model)
+
+        assert bounded.models.misses == 3
+
+    def test_evicted_models_keep_learning(self, tmpdir):
+        slack_logs = self.build_logs(tmpdir)
+        controller = ModelController('U0000000B', 'bot', slack_logs, {},
+                                     model_cache_size=1)
+        worker = TrainingWorker(controller, slack_logs)
+
+        worker.start()
+        worker.submit({'type': 'message', 'user': 'U00000001',
+                       'text': 'Something new about general.'}, 'general')
+        worker.stop()
+
+        retrained = ModelController('U0000000B', 'bot', slack_logs, {})
+
+        assert (controller.master_model.chain.model ==
+                retrained.master_model.chain.model)
+
+        for kind in ('channel_models', 'user_models'):
+            for name, model in getattr(retrained, kind).items():
+                assert (getattr(controller, kind)[name].chain.model ==
+                        model.chain.model)
+
+    def test_master_index_is_rebuilt_within_budget(self, tmpdir):
+        slack_logs = self.build_logs(tmpdir)
+        controller = ModelController('U0000000B', 'bot', slack_logs, {},
+                                     model_cache_size=1)
+        master = controller.master_model
+
+        full_index = master.ngram_index
+        full_index.count = full_index.capacity + 1
+
+        # Replies keep using the full index rather than rebuilding it.
+        assert master.ngram_index is full_index
+        assert controller.models.metrics()['resident'] == 1
+
+        controller.reindex_master_model()
+        ngram_index = master.ngram_index
+
+        assert ngram_index is not full_index
+        assert not ngram_index.is_full()
+        assert ['about', 'music', 'number', '3'] in ngram_index
+        assert controller.models.metrics()['resident'] == 1
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_model_controller
+----------------------------------
+
+Tests for `markov_slackbot.model_controller` module.
+"""
+
+import json
+import threading
+
+from markov_slackbot.external_texts import ExternalTexts
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.slack_logs import SlackLogs
+
+
+class TestModelController(object):
+
+    def test_parallel_training_matches_serial(self, tmpdir):
+        logs = tmpdir.mkdir('logs')
+
+        for i in range(4):
+            logs.mkdir('channel{0}'.format(i)).join('2016-07-16.jsonl').write(
+                '\n'.join(json.dumps({'type': 'message',
+                                      'user': 'U0000000{0}'.format(j),
+                                      'text': 'Message {0} of {1}.'.format(
+                                          j, i)})
+                          for j in range(i + 1)) + '\n')
+
+        slack_logs = SlackLogs(str(logs))
+        external_texts = {'empty': '', 'book': 'A short book. The end.'}
+
+        serial = ModelController('U0000000B', 'bot', slack_logs,
+                                 external_texts, chain_backend='compact')
+        parallel = ModelController('U0000000B', 'bot', slack_logs,
+                                   external_texts, chain_backend='compact',
+                                   training_processes=2)
+
+        for kind in ('channel_models', 'user_models'):
+            serial_models = getattr(serial, kind)
+            parallel_models = getattr(parallel, kind)
+
+            assert sorted(serial_models) == sorted(parallel_models)
+
+            for name, model in serial_models.items():
+                assert (dict(model.chain.model) ==
+                        dict(parallel_models[name].chain.model))
+                assert (model.rejoined_text ==
+                        parallel_models[name].rejoined_text)
+
+    def test_external_models_are_trained_on_first_use(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        external_texts = {'empty': '', 'book': 'A short book. The end.'}
+
+        controller = ModelController('U0000000B', 'bot', slack_logs,
+                                     external_texts)
+
+        assert sorted(controller.external_models) == ['book', 'empty']
+        assert controller.external_models.peek('book') is None
+
+        book = controller.external_models.get('book')
+
+        assert book.chain.model
+        assert controller.external_models.peek('book') is book
+        assert controller.external_models.get('missing') is None
+
+    def test_large_external_texts_are_never_read_whole(self, tmpdir):
+        external_dir = tmpdir.mkdir('external_texts')
+        external_dir.join('book.txt').write('A long book. ' * 100)
+
+        class StreamedTexts(ExternalTexts):
+            def __getitem__(self, text_name):
+                raise AssertionError('Read {0} whole.'.format(text_name))
+
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        external_texts = StreamedTexts(str(external_dir), stream_size=100,
+                                       chunk_size=64)
+        controller = ModelController('U0000000B', 'bot', slack_logs,
+                                     external_texts)
+
+        assert 'book' in external_texts
+        assert controller.external_models.get('book').chain.model
+
+    def test_new_models_train_outside_the_lock(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        controller = ModelController('U0000000B', 'bot', slack_logs, {})
+        generate_slack_model = controller.generate_slack_model
+        lock_free = []
+
+        def check_lock(log):
+            thread = threading.Thread(target=lambda: lock_free.append(
+                controller.lock.acquire(timeout=1) and
+                controller.lock.release() is None))
+            thread.start()
+            thread.join()
+
+            return generate_slack_model(log)
+
+        controller.generate_slack_model = check_lock
+        message = {'type': 'message', 'user': 'U00000001',
+                   'text': 'Hello there.', 'ts': '1.0'}
+
+        controller.update_slack_models(slack_logs, 'general', [
+            controller.log_message(slack_logs, message, 'general')])
+
+        assert lock_free == [True, True]
+        assert controller.channel_models['general'].chain.model
+        assert not controller.unlearned
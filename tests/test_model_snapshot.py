@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_model_snapshot
+----------------------------------
+
+Tests for `markov_slackbot.model_snapshot` module.
+"""
+
+import json
+
+from markov_slackbot.external_texts import ExternalTexts
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.model_snapshot import ModelSnapshot
+from markov_slackbot.slack_logs import SlackLogs
+
+
+def write_log(channel_dir, filename, messages):
+    channel_dir.join(filename).write(
+        '\n'.join(json.dumps({'type': 'message', 'user': user, 'text': text})
+                  for user, text in messages) + '\n')
+
+
+class TestModelSnapshot(object):
+
+    def build_controller(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        snapshot = ModelSnapshot(
+            str(tmpdir.join('snapshot')),
+            str(tmpdir.join('texts')))
+
+        return ModelController('U0000000B', 'bot', slack_logs, {},
+                               snapshot=snapshot)
+
+    def test_only_changed_sources_are_retrained(self, tmpdir):
+        logs = tmpdir.mkdir('logs')
+        write_log(logs.mkdir('general'), '2016-07-16.jsonl', [
+            ('U00000001', 'Hello there.'), ('U00000002', 'General talk.')])
+        write_log(logs.mkdir('random'), '2016-07-16.jsonl', [
+            ('U00000003', 'Random talk.')])
+
+        first = self.build_controller(tmpdir)
+        assert len(first.channel_models) == 2
+
+        second = self.build_controller(tmpdir)
+        assert second.snapshot.find_stale_models(
+            'U0000000B', 'bot', SlackLogs(str(logs))) == {
+                'channels': set(), 'users': set(), 'external_texts': set()}
+        assert (second.channel_models['general'].chain.model ==
+                first.channel_models['general'].chain.model)
+        assert (second.master_model.chain.model ==
+                first.master_model.chain.model)
+
+        write_log(logs.join('random'), '2016-07-17.jsonl', [
+            ('U00000003', 'More random talk.')])
+
+        stale = second.snapshot.find_stale_models(
+            'U0000000B', 'bot', SlackLogs(str(logs)))
+        assert stale == {
+            'channels': {'random'},
+            'users': {'U00000003'}, 'external_texts': set()}
+
+    def test_external_models_are_saved_when_trained(self, tmpdir):
+        tmpdir.mkdir('logs')
+        tmpdir.mkdir('texts').join('book.txt').write(
+            'It was a dark and stormy night. The rain fell in torrents.')
+        texts = ExternalTexts(str(tmpdir.join('texts')))
+        snapshot = ModelSnapshot(
+            str(tmpdir.join('snapshot')),
+            str(tmpdir.join('texts')))
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+
+        controller = ModelController('U0000000B', 'bot', slack_logs, texts,
+                                     snapshot=snapshot)
+        assert snapshot.manifest['models']['external_texts'] == {}
+
+        controller.save_snapshot(slack_logs, train_external=True)
+        assert snapshot.manifest['models']['external_texts'] == {
+            'book': True}
+        assert snapshot.find_stale_models(
+            'U0000000B', 'bot', slack_logs)['external_texts'] == set()
+
+        second = ModelController('U0000000B', 'bot', slack_logs, texts,
+                                 snapshot=snapshot)
+        assert (second.external_models['book'].chain.model ==
+                controller.external_models['book'].chain.model)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_name_index
+----------------------------------
+
+Tests for `markov_slackbot.name_index` module.
+"""
+
+from collections import namedtuple
+
+from markov_slackbot.name_index import NameIndex
+
+
+Item = namedtuple('Item', ['id', 'name'])
+
+
+class FakeServer(object):
+    channels = [Item('C00000001', 'general'), Item('D00000001', 'U00000001')]
+    users = [Item('U00000001', 'alice')]
+
+
+class TestNameIndex(object):
+
+    def test_lookups_both_ways(self):
+        index = NameIndex()
+        index.build(FakeServer())
+
+        assert index.channel_name('C00000001') == 'general'
+        assert index.channel_id('#general') == 'C00000001'
+        assert index.channel_name('D00000001') == 'U00000001'
+        assert index.username('U00000001') == 'alice'
+        assert index.user_id('alice') == 'U00000001'
+        assert index.username('U00000002') is None
+
+    def test_events_keep_the_index_current(self):
+        index = NameIndex()
+        index.build(FakeServer())
+
+        index.update({'type': 'channel_rename',
+                      'channel': {'id': 'C00000001', 'name': 'lobby'}})
+        index.update({'type': 'channel_created',
+                      'channel': {'id': 'C00000002', 'name': 'random'}})
+        index.update({'type': 'user_change',
+                      'user': {'id': 'U00000001', 'name': 'alicia'}})
+        index.update({'type': 'team_join',
+                      'user': {'id': 'U00000002', 'name': 'bob'}})
+
+        assert index.channel_name('C00000001') == 'lobby'
+        assert index.channel_id('general') is None
+        assert index.channel_id('random') == 'C00000002'
+        assert index.username('U00000001') == 'alicia'
+        assert index.user_id('alice') is None
+        assert index.user_id('bob') == 'U00000002'
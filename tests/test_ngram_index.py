@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_ngram_index
+----------------------------------
+
+Tests for `markov_slackbot.ngram_index` module.
+"""
+
+import random
+
+import markovify
+
+from markov_slackbot.incremental_text import IncrementalText
+from markov_slackbot.ngram_index import NgramIndex
+
+
+class TestNgramIndex(object):
+
+    def test_every_run_is_indexed(self):
+        words = ['w{0}a'.format(i) for i in range(30)]
+        ngram_index = NgramIndex(max_length=4)
+        ngram_index.add(words)
+
+        assert ngram_index.count == ngram_index.count_ngrams(30)
+
+        for start in range(30):
+            for length in range(1, 5):
+                if start + length <= 30:
+                    assert words[start:start + length] in ngram_index
+
+    def test_agrees_with_searching_the_text(self):
+        rng = random.Random(0)
+        vocabulary = ['W{0}a'.format(i) for i in range(30)]
+
+        model = IncrementalText('')
+        sentences = []
+
+        for i in range(40):
+            words = [rng.choice(vocabulary)
+                     for j in range(rng.randint(1, 12))] + ['End.']
+            model.add_text(' '.join(words), separator=' ')
+            sentences.append(words)
+
+            if i == 20:
+                assert model.ngram_index.count
+
+        agreed = 0
+
+        for i in range(300):
+            if i % 2:
+                sentence = rng.choice(sentences)
+                start = rng.randrange(len(sentence))
+                words = sentence[start:start + rng.randint(1, 20)]
+            else:
+                words = [rng.choice(vocabulary)
+                         for j in range(rng.randint(1, 20))]
+
+            searched = markovify.Text.test_sentence_output(
+                model, words, 0.7, 15)
+            indexed = model.test_sentence_output(words, 0.7, 15)
+
+            # No word occurs inside another and runs never cross sentences,
+            # so only false positives can tell the index apart.
+            assert indexed <= searched
+            agreed += indexed == searched
+
+        assert agreed > 270
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_sentence_pool
+----------------------------------
+
+Tests for `markov_slackbot.sentence_pool` module.
+"""
+
+import json
+
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.sentence_pool import MASTER_KEY, SentencePool
+from markov_slackbot.slack_logs import SlackLogs
+
+
+def build_controller(tmpdir):
+    channel_dir = tmpdir.mkdir('logs').mkdir('general')
+    channel_dir.join('2016-07-16.jsonl').write('\n'.join(
+        json.dumps({'type': 'message', 'user': 'U0000000{0}'.format(i % 3),
+                    'text': 'Start{0} alpha{0} the cat beta{0} gamma{0} '
+                            'delta{0}.'.format(i)})
+        for i in range(10)) + '\n')
+
+    return ModelController('U0000000B', 'bot',
+                           SlackLogs(str(tmpdir.join('logs'))), {})
+
+
+class TestSentencePool(object):
+
+    def test_refills_and_serves_requests(self, tmpdir):
+        controller = build_controller(tmpdir)
+        pool = SentencePool(controller, pool_size=5, refill_threshold=2)
+        controller.sentence_pool = pool
+        channel_key = ('channels', 'general')
+        channel_model = controller.channel_models['general']
+
+        assert pool.take([channel_key], [channel_model], [1]) is None
+
+        pool.refill()
+        assert len(pool.pools) == 2
+
+        sentences = pool.pools[pool.make_key([channel_key], [1])][2]
+        pooled = [sentence for generated, sentence in sentences]
+        assert len(pooled) == 5
+
+        assert pool.take([channel_key], [channel_model], [1]) == pooled[0]
+        assert controller.build_message([], ['general'], [], []) == pooled[1]
+        assert pool.metrics()['hits'] == 2
+
+        pool.invalidate(channel_key)
+        assert len(pool.pools) == 1
+        assert list(pool.requests) == []
+
+    def test_expired_sentences_are_dropped(self, tmpdir):
+        controller = build_controller(tmpdir)
+        pool = SentencePool(controller, pool_size=5, max_age=-1)
+
+        pool.refill()
+        assert pool.take([MASTER_KEY], [controller.master_model], [1]) is None
+
+    def test_unpopular_pools_are_dropped(self, tmpdir):
+        controller = build_controller(tmpdir)
+        pool = SentencePool(controller, pool_size=1, max_pools=2)
+        channel_model = controller.channel_models['general']
+
+        for i in range(3):
+            pool.take([('channels', 'general')], [channel_model], [1])
+
+        for user in ('U00000000', 'U00000001'):
+            pool.take([('users', user)], [controller.user_models[user]], [1])
+
+        pool.refill()
+
+        master_key = pool.make_key([MASTER_KEY], [1])
+        channel_key = pool.make_key([('channels', 'general')], [1])
+        assert sorted(pool.pools) == sorted([master_key, channel_key])
+        assert sorted(pool.requests) == [channel_key]
+
+    def test_empty_and_failing_pools_dont_stop_refills(self, tmpdir):
+        tmpdir.mkdir('logs')
+        controller = ModelController(
+            'U0000000B', 'bot', SlackLogs(str(tmpdir.join('logs'))),
+            {'book': ' '.join(
+                'Start{0} alpha{0} the cat beta{0} gamma{0} delta{0}.'.format(
+                    i) for i in range(10)),
+             'broken': 'The rain fell. The wind blew.'})
+        pool = SentencePool(controller, pool_size=2, refill_threshold=1)
+        book_key = ('external_texts', 'book')
+        broken_key = ('external_texts', 'broken')
+        book = controller.external_models['book']
+        broken = controller.external_models['broken']
+        generate_sentence = controller.generate_sentence
+
+        def generate_or_fail(models, weights):
+            if broken in models:
+                raise KeyError(broken_key)
+
+            return generate_sentence(models, weights)
+
+        controller.generate_sentence = generate_or_fail
+
+        pool.take([broken_key], [broken], [1])
+        pool.take([book_key], [book], [1])
+        pool.refill()
+
+        assert controller.master_model.is_empty()
+        assert len(pool.pools[pool.make_key([MASTER_KEY], [1])][2]) == 0
+        assert len(pool.pools[pool.make_key([broken_key], [1])][2]) == 0
+        assert len(pool.pools[pool.make_key([book_key], [1])][2]) == 2
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_slack_logs
+----------------------------------
+
+Tests for `markov_slackbot.slack_logs` module.
+"""
+
+import json
+import os
+
+from markov_slackbot.log_writer import migrate_log_directory
+from markov_slackbot.slack_logs import SlackLogs
+
+
+def message(text, user='U00000001'):
+    return {'type': 'message', 'user': user, 'text': text}
+
+
+class TestSlackLogs(object):
+
+    def test_append_and_read_back(self, tmpdir):
+        slack_log_dir = str(tmpdir.join('logs'))
+
+        logs = SlackLogs(slack_log_dir, flush_every=10)
+        logs.add_to_logs(message('First.'), 'general')
+        logs.add_to_logs(message('Second.', 'U00000002'), 'general')
+        logs.close()
+
+        logs = SlackLogs(slack_log_dir)
+
+        assert [m['text'] for m in logs.channel_logs['general']] == [
+            'First.', 'Second.']
+        assert len(logs.master_log) == 2
+        assert sorted(logs.user_logs) == ['U00000001', 'U00000002']
+        assert logs.user_logs['U00000001'] == [
+            {'user': 'U00000001', 'text': 'First.',
+             'cleaned_text': 'First.'}]
+        assert logs.user_logs['U00000001'][0] is (
+            logs.channel_logs['general'][0])
+
+    def test_migrate_legacy_logs(self, tmpdir):
+        channel_dir = tmpdir.mkdir('logs').mkdir('general')
+        channel_dir.join('2016-07-16.json').write(
+            json.dumps([message('Old.')], indent=4))
+        channel_dir.join('2016-07-16.jsonl').write(
+            json.dumps(message('New.')) + '\n')
+        channel_dir.join('2016-07-17.json').write(
+            json.dumps([message('Later.')], indent=4))
+
+        slack_log_dir = str(tmpdir.join('logs'))
+        before = SlackLogs(slack_log_dir).channel_logs
+
+        assert migrate_log_directory(slack_log_dir) == 2
+        assert sorted(os.listdir(str(channel_dir))) == [
+            '2016-07-16.jsonl', '2016-07-17.jsonl']
+        assert SlackLogs(slack_log_dir).channel_logs == before
+
+    def test_leftover_temporary_files_are_skipped(self, tmpdir):
+        channel_dir = tmpdir.mkdir('logs').mkdir('general')
+        channel_dir.join('2016-07-16.jsonl').write(
+            json.dumps(message('Kept.')) + '\n')
+        channel_dir.join('2016-07-17.jsonl.tmp').write(
+            json.dumps(message('Half migrated.')))
+
+        logs = SlackLogs(str(tmpdir.join('logs')))
+
+        assert [path for channel_name, path in logs.list_logfiles()] == [
+            str(channel_dir.join('2016-07-16.jsonl'))]
+        assert [log_message['text'] for log_message
+                in logs.channel_logs['general']] == ['Kept.']
+
+    def test_parallel_reading_keeps_order(self, tmpdir):
+        slack_log_dir = str(tmpdir.join('logs'))
+
+        logs = SlackLogs(slack_log_dir)
+
+        for i in range(20):
+            logs.add_to_logs(message('Message {0}.'.format(i)),
+                             'channel{0}'.format(i % 3))
+
+        logs.close()
+
+        serial = SlackLogs(slack_log_dir)
+
+        for read_executor in ('thread', 'process'):
+            parallel = SlackLogs(slack_log_dir, read_workers=2,
+                                 read_executor=read_executor)
+
+            assert parallel.channel_logs == serial.channel_logs
+            assert parallel.user_logs == serial.user_logs
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_sqlite_logs
+----------------------------------
+
+Tests for `markov_slackbot.sqlite_logs` module.
+"""
+
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.slack_logs import SlackLogs, slim_message
+from markov_slackbot.sqlite_logs import SqliteLogs
+
+
+def message(text, user='U00000001', ts=None):
+    return {'type': 'message', 'user': user, 'text': text, 'ts': ts}
+
+
+class TestSqliteLogs(object):
+
+    def test_import_matches_log_directory(self, tmpdir):
+        slack_log_dir = str(tmpdir.join('logs'))
+
+        slack_logs = SlackLogs(slack_log_dir)
+        slack_logs.add_to_logs(message('Hello there.', ts='1.0'), 'general')
+        slack_logs.add_to_logs(message('Random talk.', 'U00000002', '2.0'),
+                               'random')
+        slack_logs.add_to_logs(message('General talk.', 'U00000002', '3.0'),
+                               'general')
+        slack_logs.close()
+        slack_logs = SlackLogs(slack_log_dir)
+
+        logs = SqliteLogs(str(tmpdir.join('logs.db')))
+        assert logs.import_log_directory(slack_log_dir) == 3
+        assert logs.import_log_directory(slack_log_dir) == 0
+
+        assert sorted(logs.channel_logs) == sorted(slack_logs.channel_logs)
+        assert all([slim_message(m) for m in logs.channel_logs[name]] ==
+                   channel_log
+                   for name, channel_log in slack_logs.channel_logs.items())
+
+        # User logs follow the import order of the channels.
+        assert sorted(logs.user_logs) == sorted(slack_logs.user_logs)
+        assert all(sorted(m['ts'] for m in logs.user_logs[user]) ==
+                   sorted(m['ts'] for m in user_log)
+                   for user, user_log in slack_logs.user_logs.items())
+
+        assert len(logs.master_log) == 3
+        assert [m['text'] for m in logs.read_messages(
+            user='U00000002', since='2.5')] == ['General talk.']
+
+        from_files = ModelController('U0000000B', 'bot', slack_logs, {})
+        from_database = ModelController('U0000000B', 'bot', logs, {})
+        assert (from_database.channel_models['general'].chain.model ==
+                from_files.channel_models['general'].chain.model)
+
+    def test_add_to_logs(self, tmpdir):
+        database_path = str(tmpdir.join('logs.db'))
+
+        logs = SqliteLogs(database_path, flush_every=10)
+        logs.add_to_logs(message('First.'), 'general')
+        fingerprint = logs.fingerprint_channels()
+        logs.add_to_logs(message('Second.'), 'general')
+        logs.close()
+
+        logs = SqliteLogs(database_path)
+        assert [m['text'] for m in logs.channel_logs['general']] == [
+            'First.', 'Second.']
+        assert logs.fingerprint_channels() != fingerprint
+        assert 'random' not in logs.channel_logs
+
+    def test_stored_text_is_recleaned(self, tmpdir, monkeypatch):
+        database_path = str(tmpdir.join('logs.db'))
+
+        logs = SqliteLogs(database_path)
+        logged = logs.add_to_logs(message('Hi <there>'), 'general')
+        assert logged['cleaned_text'] == 'Hi '
+        logs.close()
+
+        monkeypatch.setattr('markov_slackbot.sqlite_logs.CLEANING_VERSION', 2)
+        monkeypatch.setattr('markov_slackbot.sqlite_logs.clean_text',
+                            lambda text: text.upper())
+
+        logs = SqliteLogs(database_path)
+        assert [m['cleaned_text'] for m in logs.master_log] == ['HI <THERE>']
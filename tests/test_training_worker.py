@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_training_worker
+----------------------------------
+
+Tests for `markov_slackbot.training_worker` module.
+"""
+
+import time
+
+from markov_slackbot.model_controller import ModelController
+from markov_slackbot.slack_logs import SlackLogs
+from markov_slackbot.training_worker import TrainingWorker
+
+
+def message(text, user='U00000001'):
+    return {'type': 'message', 'user': user, 'text': text}
+
+
+class TestTrainingWorker(object):
+
+    def test_learns_in_background(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        controller = ModelController('U0000000B', 'bot', slack_logs, {})
+        worker = TrainingWorker(controller, slack_logs, max_queue_size=10)
+
+        worker.start()
+        assert worker.submit(message('Hello there.'), 'general')
+        assert worker.submit(message('General Kenobi.', 'U00000002'),
+                             'general')
+        worker.stop()
+
+        assert worker.metrics()['processed'] == 2
+        assert len(controller.channel_models['general'].chain.model) > 0
+        assert sorted(controller.user_models) == ['U00000001', 'U00000002']
+        assert controller.master_model.models == [
+            controller.channel_models['general']]
+
+    def test_full_queue_drops_messages(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        controller = ModelController('U0000000B', 'bot', slack_logs, {})
+        worker = TrainingWorker(controller, slack_logs, max_queue_size=1,
+                                put_timeout=0.01)
+
+        assert worker.submit(message('First.'), 'general')
+        assert not worker.submit(message('Second.'), 'general')
+        assert worker.metrics()['dropped'] == 1
+
+    def test_batches_match_retraining(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        controller = ModelController('U0000000B', 'bot', slack_logs, {})
+        worker = TrainingWorker(controller, slack_logs, batch_size=10,
+                                batch_interval=60, max_staleness=60)
+
+        worker.start()
+        worker.submit(message('Hello there'), 'general')
+        worker.stop()
+
+        worker.start()
+        worker.submit(message('General Kenobi. You are'), 'general')
+        worker.submit(message('a bold one'), 'general')
+        worker.stop()
+
+        assert worker.metrics()['batches'] == 2
+
+        retrained = controller.generate_slack_model(
+            slack_logs.channel_logs['general'])
+        assert (dict(controller.channel_models['general'].chain.model) ==
+                dict(retrained.chain.model))
+
+    def test_messages_are_logged_before_they_are_learned(self, tmpdir):
+        slack_logs = SlackLogs(str(tmpdir.join('logs')))
+        controller = ModelController('U0000000B', 'bot', slack_logs, {})
+        worker = TrainingWorker(controller, slack_logs, batch_size=10,
+                                batch_interval=60, max_staleness=60)
+
+        worker.start()
+        worker.submit(message('Hello there.'), 'general')
+
+        while worker.metrics()['processed'] < 1:
+            time.sleep(0.01)
+
+        assert len(SlackLogs(str(tmpdir.join('logs'))).master_log) == 1
+        assert 'general' not in controller.channel_models
+
+        worker.stop()
+
+        assert 'general' in controller.channel_models